@@ -1,18 +1,68 @@
 
 import eel
+import bottle
+import gevent
 import os
 import json
 import datetime
-from PIL import Image
 import warnings
-from web.scripts.PDFcreator import PDFBookletCreator
-from web.scripts.Explorer import create_folder_html
+from web.scripts.PDFcreator import PDFBookletCreator, BACKEND_VECTOR, DEFAULT_MEMORY_LIMIT_MB
+from web.scripts.Explorer import write_folder_html
 from web.scripts.log_app import log_server_action, CONFIG_FILE_NAME
+from web.scripts.jobs import JobManager, JobCancelledError, FINISHED_STATUSES
+from web.scripts.preview_store import PREVIEW_STORE, PREVIEW_ROUTE_PREFIX
+from web.scripts.directory_listing import DIRECTORY_LISTING, DEFAULT_PAGE_SIZE
+from web.scripts.pdf_index import PdfIndex, DEFAULT_SEARCH_LIMIT
+from web.scripts.pdf_metadata import PdfMetadataCache
 import webbrowser
 
 warnings.filterwarnings("ignore")
 
+# Состояние последнего задания: при повторной подготовке того же файла
+# перекомпонуются только изменившиеся листы
+_last_booklet_state = None
+
+# Бюджет: время выполнения одного задания (с) и прирост памяти всего процесса (МБ),
+# общий для всех заданий (см. JobManager)
+JOB_TIMEOUT_SECONDS = 30 * 60
+PROCESS_MEMORY_BUDGET_MB = 4096
+
+# Фоновые задания: длительная обработка не блокирует цикл событий eel
+job_manager = JobManager(job_timeout=JOB_TIMEOUT_SECONDS, memory_budget_mb=PROCESS_MEMORY_BUDGET_MB)
+
+# Сведения о PDF для файлового браузера (страницы, размер, миниатюра): разбираются в фоне,
+# список папки возвращается сразу, а сведения приходят в интерфейс по мере готовности
+pdf_metadata = PdfMetadataCache()
+
+# Фоновый индекс PDF для поиска по всем папкам: запускается, если в конфигурации заданы indexRoots
+pdf_index = None
+
 eel.init('web')
+
+# Превью неизменны для пары (задание, лист): браузер может кэшировать их без повторных запросов
+PREVIEW_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+@bottle.route(f"/{PREVIEW_ROUTE_PREFIX}/<job_id>/<name>")
+def serve_preview(job_id, name):
+    """Отдает превью листа из памяти; JPEG кодируется при первом запросе вне цикла событий"""
+    number, ext = os.path.splitext(name)
+    if ext != ".jpg" or not number.isdigit() or int(number) < 1:
+        return bottle.HTTPError(404, "Превью не найдено")
+    etag = f'"{job_id}-{number}"'
+    if bottle.request.headers.get("If-None-Match") == etag:
+        return bottle.HTTPResponse(status=304, headers={"ETag": etag, "Cache-Control": PREVIEW_CACHE_CONTROL})
+    try:
+        # Рендеринг и кодирование превью - в пуле потоков gevent: цикл событий eel
+        # (websocket, события заданий) не блокируется на время работы PyMuPDF
+        data = gevent.get_hub().threadpool.apply(PREVIEW_STORE.get, (job_id, int(number) - 1))
+    except Exception as e:
+        log_server_action('Ошибка кодирования превью', 'error', {'job_id': job_id, 'sheet': number, 'error': str(e)})
+        return bottle.HTTPError(500, "Ошибка кодирования превью")
+    if data is None:
+        return bottle.HTTPError(404, "Превью не найдено")
+    return bottle.HTTPResponse(data, headers={"Content-Type": "image/jpeg", "ETag": etag,
+                                              "Cache-Control": PREVIEW_CACHE_CONTROL})
+
 def setup_window_title():
     """Устанавливает заголовок окна"""
     # Создаем красивый заголовок с иконкой
@@ -28,21 +78,11 @@ def open_folder_with_file(folder_path):
         if not os.path.exists(folder_path):
             return {"status": "error", "message": "Папка не существует"}
 
-        # Получаем список файлов и папок
-        items = os.listdir(folder_path)
-
-        # Сортируем: сначала папки, потом файлы
-        items.sort(key=lambda x: (not os.path.isdir(os.path.join(folder_path, x)), x.lower()))
-
-        # Создаем HTML с CSS стилями
-        html_content = create_folder_html(folder_path, items)
-
-        # Сохраняем HTML во временный файл
+        # Папка читается одним проходом os.scandir (сначала папки, потом файлы),
+        # HTML с CSS стилями записывается во временный файл частями по мере формирования
         current_dir = os.path.dirname(os.path.abspath(__file__))
         temp_html_path = os.path.join(current_dir, "folder.html")
-
-        with open(temp_html_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        write_folder_html(temp_html_path, folder_path)
 
         # Открываем в браузере
         webbrowser.open(f'file://{temp_html_path}')
@@ -53,7 +93,7 @@ def open_folder_with_file(folder_path):
         return {"status": "error", "message": str(e)}
 
 @eel.expose
-def get_directory_contents(path="", search_query="", only_pdf=False):
+def get_directory_contents(path="", search_query="", only_pdf=False, offset=0, limit=DEFAULT_PAGE_SIZE):
     try:
         # Если путь не указан, начинаем с домашней директории пользователя
         if not path:
@@ -64,36 +104,63 @@ def get_directory_contents(path="", search_query="", only_pdf=False):
         # Проверяем, является ли путь директорией
         if not os.path.isdir(path):
             return {"status": "error", "message": "Указанный путь не является директорией", "path": path}
-        # Получаем список файлов и папок
-        contents = []
-        search_query = search_query.lower().strip() if search_query else ""
-        for item in os.listdir(path):
-            item_path = os.path.join(path, item)
-            is_dir = os.path.isdir(item_path)
-            is_pdf = item.lower().endswith('.pdf') if not is_dir else False
-            # Применяем фильтры
-            if search_query and search_query not in item.lower():
-                continue  # Пропускаем элементы, не соответствующие поисковому запросу
-            if only_pdf and not is_dir and not is_pdf:
-                continue  # Пропускаем файлы, которые не являются PDF, если включён фильтр
-            contents.append({
-                "name": item,
-                "path": item_path,
-                "is_dir": is_dir,
-                "is_pdf": is_pdf
-            })
-        # Сортируем: сначала папки, потом файлы
-        contents.sort(key=lambda x: (not x["is_dir"], x["name"].lower()))
+        # Содержимое папки читается один раз и кэшируется до ее изменения,
+        # фильтры применяются к кэшу, в интерфейс отдается одна страница
+        listing = DIRECTORY_LISTING.list(path, search_query, only_pdf, offset, limit)
+        _request_pdf_metadata(listing["contents"], new_listing=(offset == 0))
         return {
             "status": "success",
             "path": path,
-            "contents": contents
+            **listing
         }
     except PermissionError:
         return {"status": "error", "message": "Доступ к директории запрещён. Попробуйте другую папку.", "path": path}
     except Exception as e:
         return {"status": "error", "message": f"Ошибка при получении содержимого директории: {str(e)}", "path": path}
 
+def _request_pdf_metadata(items, new_listing):
+    # Новый список отменяет еще не начатый разбор файлов прошлого списка
+    generation = pdf_metadata.next_generation() if new_listing else None
+    pdf_metadata.request((item["path"] for item in items if item.get("is_pdf", True)), generation)
+
+def _start_pdf_index(roots):
+    global pdf_index
+    if pdf_index is not None:
+        pdf_index.stop()
+        pdf_index = None
+    roots = [root for root in roots or [] if root]
+    if roots:
+        pdf_index = PdfIndex(roots).start()
+
+@eel.expose
+def search_pdf_index(search_query, limit=DEFAULT_SEARCH_LIMIT):
+    try:
+        if pdf_index is None:
+            return {"status": "error",
+                    "message": "Индекс PDF не настроен: укажите папки в indexRoots файла конфигурации."}
+        results = pdf_index.search(search_query or "", limit)
+        _request_pdf_metadata(results, new_listing=True)
+        return {"status": "success", "results": results, "indexed_files": pdf_index.status()["files"]}
+    except Exception as e:
+        return {"status": "error", "message": f"Ошибка поиска по индексу: {str(e)}"}
+
+@eel.expose
+def set_index_roots(roots):
+    try:
+        config = _read_config()
+        config["indexRoots"] = [os.path.abspath(root) for root in roots or [] if root]
+        save_config(config)
+        _start_pdf_index(config["indexRoots"])
+        return {"status": "success", "message": "Папки индекса PDF сохранены", "roots": config["indexRoots"]}
+    except Exception as e:
+        return {"status": "error", "message": f"Ошибка настройки индекса PDF: {str(e)}"}
+
+@eel.expose
+def get_index_status():
+    if pdf_index is None:
+        return {"status": "error", "message": "Индекс PDF не настроен"}
+    return {"status": "success", "index": pdf_index.status()}
+
 @eel.expose
 def get_parent_directory(path):
     try:
@@ -137,6 +204,17 @@ def log_client_action(log_entry):
     except Exception as e:
         return {"success": False, "message": f"Ошибка при логировании клиентского действия: {str(e)}"}
 
+def _config_path():
+    return os.path.join(os.path.expanduser("~"), ".pdf_booklet_creator", CONFIG_FILE_NAME)
+
+def _read_config():
+    # Сохраненная конфигурация или пустой словарь
+    try:
+        with open(_config_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
 @eel.expose
 def save_config(settings):
     try:
@@ -148,11 +226,14 @@ def save_config(settings):
         if not os.path.exists(config_dir):
             os.makedirs(config_dir)
 
-        config_path = os.path.join(config_dir, CONFIG_FILE_NAME)
+        config_path = _config_path()
 
-        # Сохраняем конфигурацию
+        # Сохраняем конфигурацию; ключи, которых нет в настройках интерфейса
+        # (например, indexRoots), сохраняются
+        config = _read_config()
+        config.update(settings)
         with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, indent=2, ensure_ascii=False)
+            json.dump(config, f, indent=2, ensure_ascii=False)
 
         log_server_action('Конфигурация сохранена', 'info', {'settings': settings})
         return {"success": True, "message": "Конфигурация успешно сохранена"}
@@ -184,102 +265,165 @@ def load_config():
         log_server_action('Ошибка при загрузке конфигурации', 'error', {'error': str(e)})
         return {"success": False, "message": f"Ошибка при загрузке конфигурации: {str(e)}"}
 
+def _validate_booklet_paths(input_path, output_path):
+    if not input_path:
+        return {"status": "error", "message": "Не выбран входной PDF файл."}
+    if not output_path:
+        return {"status": "error", "message": "Не указан путь для выходного файла."}
+    if not os.path.exists(input_path):
+        return {"status": "error", "message": "Входной файл не найден."}
+    return None
+
 @eel.expose
-def create_booklet(input_path, output_path, rotate_all=False, rotate=False, flip_horizontal=False, flip_vertical=False):
+def create_booklet(input_path, output_path, rotate_all=False, rotate=False, flip_horizontal=False, flip_vertical=False,
+                   signature_sheets=None, progress_callback=None, cancel_check=None, job_id=None):
     try:
-        if not input_path:
-            return {"status": "error", "message": "Не выбран входной PDF файл."}
-        if not output_path:
-            return {"status": "error", "message": "Не указан путь для выходного файла."}
-        if not os.path.exists(input_path):
-            return {"status": "error", "message": "Входной файл не найден."}
-
-        # Создаем экземпляр класса
-        booklet_creator = PDFBookletCreator(input_pdf_path=input_path, output_pdf_path=output_path)
-
-        # Получаем все изображения страниц
-        all_images = booklet_creator.pdf_to_images(str(input_path))
-        total_pages = len(all_images)
-
-        # Рассчитываем порядок страниц
-        booklet_pairs = booklet_creator.calculate_booklet_order(
-            total_pages,
-            rotate_all,
-            rotate,
-            flip_horizontal,
-            flip_vertical
+        error = _validate_booklet_paths(input_path, output_path)
+        if error:
+            return error
+
+        # Быстрое превью: страницы рендерятся сразу в размере галереи, итоговый PDF не создается.
+        # Листы регистрируются в PREVIEW_STORE и компонуются, только когда галерея их запросит
+        booklet_creator = PDFBookletCreator(input_pdf_path=input_path, output_pdf_path=output_path,
+                                            progress_callback=progress_callback, cancel_check=cancel_check,
+                                            job_id=job_id)
+        result = booklet_creator.create_preview(
+            rotate_all=rotate_all,
+            rotate=rotate,
+            flip_horizontal=flip_horizontal,
+            flip_vertical=flip_vertical,
+            signature_sheets=signature_sheets or None
         )
+        gallery_pages = result["gallery_pages"]
+
+        return {
+            "status": "success",
+            "message": "Превью буклета готово. Проверьте листы и нажмите «Экспорт в PDF».",
+            "gallery_pages": gallery_pages,
+            "total_pages": len(gallery_pages)
+        }
+    except JobCancelledError:
+        raise
+    except Exception as e:
+        return {"status": "error", "message": f"Ошибка при создании превью буклета: {str(e)}"}
+
+@eel.expose
+def export_booklet(input_path, output_path, rotate_all=False, rotate=False, flip_horizontal=False, flip_vertical=False,
+                   signature_sheets=None, backend=BACKEND_VECTOR, memory_limit_mb=None, progress_callback=None,
+                   cancel_check=None, job_id=None):
+    global _last_booklet_state
+    try:
+        error = _validate_booklet_paths(input_path, output_path)
+        if error:
+            return error
+        # Потолок памяти окна страниц потокового режима (0 или None - по умолчанию)
+        memory_limit_mb = int(memory_limit_mb or DEFAULT_MEMORY_LIMIT_MB)
+        if memory_limit_mb < 1:
+            return {"status": "error", "message": "Некорректный потолок памяти: укажите значение в МБ больше нуля."}
 
-        gallery_pages = []
-
-        # Создаем папку для временных изображений
-        temp_images_dir = os.path.join("assets", "temp_pictures")
-        if not os.path.exists(temp_images_dir):
-            os.makedirs(temp_images_dir)
-
-        # Очищаем предыдущие временные файлы
-        for file in os.listdir(temp_images_dir):
-            if file.endswith(".jpg"):
-                os.remove(os.path.join(temp_images_dir, file))
-
-        # Создаем комбинированные страницы для галереи
-        a4_size_landscape = (3508, 2480)
-        for i, (left_num, right_num) in enumerate(booklet_pairs):
-            left_img = all_images[left_num - 1] if left_num else None
-            right_img = all_images[right_num - 1] if right_num else None
-            is_back_side = (i % 2 == 1)
-
-            # Создаем комбинированную страницу
-            combined_img = booklet_creator.create_combined_page(
-                left_img,
-                right_img,
-                a4_size_landscape,
-                is_back_side,
-                flip_horizontal,
-                flip_vertical
-            )
-
-            # Масштабируем для превью (уменьшаем размер)
-            preview_size = (1200, 850)  # Размер для превью
-            preview_img = combined_img.copy()
-            preview_img.thumbnail(preview_size, Image.LANCZOS)
-
-            # Сохраняем изображение в папку temp_pictures
-            temp_img_path = os.path.join(temp_images_dir, f"{i + 1}.jpg")
-            preview_img.save(temp_img_path, "JPEG", quality=90)
-
-            gallery_pages.append({
-                "page_number": i + 1,
-                "image_path": f"assets/temp_pictures/{i + 1}.jpg",
-                "is_back_side": is_back_side,
-                "left_page_num": left_num,
-                "right_page_num": right_num
-            })
-
-        # Создаем финальный буклет PDF
-        result_path = booklet_creator.create_booklet_pdf(
+        # Создаем экземпляр класса
+        booklet_creator = PDFBookletCreator(input_pdf_path=input_path, output_pdf_path=output_path,
+                                            memory_limit_mb=memory_limit_mb,
+                                            progress_callback=progress_callback, cancel_check=cancel_check,
+                                            job_id=job_id)
+
+        # Раскладка листов, превью и итоговый PDF - за один проход
+        # (векторный режим по умолчанию, растровый - запасной, потоковый - растровый в ограниченной памяти)
+        result = booklet_creator.create_booklet(
             rotate_all=rotate_all,
             rotate=rotate,
             flip_horizontal=flip_horizontal,
-            flip_vertical=flip_vertical
+            flip_vertical=flip_vertical,
+            backend=backend,
+            previous_state=_last_booklet_state,
+            signature_sheets=signature_sheets or None
         )
+        _last_booklet_state = booklet_creator.job_state
+        result_path = result["result_path"]
+        gallery_pages = result["gallery_pages"]
 
-        return {
+        response = {
             "status": "success",
             "message": f"Буклет успешно создан: {result_path}",
             "result_path": result_path,
             "gallery_pages": gallery_pages,
-            "total_pages": len(gallery_pages)
+            "total_pages": len(gallery_pages),
+            "backend": result["backend"]
         }
+        # Потоковый режим: потолок памяти окна страниц и его фактический пик
+        for key in ("memory_limit_bytes", "peak_window_bytes"):
+            if key in result:
+                response[key] = result[key]
+        return response
+    except JobCancelledError:
+        raise
     except Exception as e:
         return {"status": "error", "message": f"Ошибка при создании буклета: {str(e)}"}
 
+def _run_booklet_job(job, handler, *args, **kwargs):
+    return handler(*args, progress_callback=job.report_progress, cancel_check=job.check_cancelled,
+                   job_id=job.job_id, **kwargs)
+
+@eel.expose
+def start_booklet_job(kind, input_path, output_path, rotate_all=False, rotate=False, flip_horizontal=False,
+                      flip_vertical=False, signature_sheets=None, backend=BACKEND_VECTOR, memory_limit_mb=None):
+    try:
+        handlers = {"preview": create_booklet, "export": export_booklet}
+        if kind not in handlers:
+            return {"status": "error", "message": f"Неизвестный тип задания: {kind}"}
+        # Режим раскладки и потолок памяти выбираются только для экспорта итогового PDF
+        options = {"backend": backend, "memory_limit_mb": memory_limit_mb} if kind == "export" else {}
+
+        job = job_manager.submit(kind, _run_booklet_job, handlers[kind], input_path, output_path,
+                                 rotate_all, rotate, flip_horizontal, flip_vertical, signature_sheets, **options)
+        log_server_action('Задание поставлено в очередь', 'info', {'job_id': job.job_id, 'kind': kind,
+                                                                   'input_path': input_path})
+        return {"status": "success", "job_id": job.job_id}
+    except Exception as e:
+        return {"status": "error", "message": f"Ошибка при запуске задания: {str(e)}"}
+
+@eel.expose
+def get_job_status(job_id):
+    job = job_manager.get_status(job_id)
+    if job is None:
+        return {"status": "error", "message": "Задание не найдено"}
+    return {"status": "success", "job": job}
+
+@eel.expose
+def cancel_job(job_id):
+    if job_manager.cancel(job_id):
+        log_server_action('Запрошена отмена задания', 'info', {'job_id': job_id})
+        return {"status": "success", "message": "Отмена задания запрошена"}
+    return {"status": "error", "message": "Задание не найдено или уже завершено"}
+
+def _push_job_events():
+    # Гринлет eel: отправляет интерфейсу изменения состояния фоновых заданий и сведения о PDF
+    while True:
+        for event in job_manager.drain_events():
+            if event["status"] in FINISHED_STATUSES:
+                # Задание забывается только после того, как интерфейс подтвердил получение итога
+                eel.on_job_progress(event)(lambda _, job_id=event["job_id"]: job_manager.acknowledge(job_id))
+            else:
+                eel.on_job_progress(event)
+        # Сведения о PDF из фонового разбора - для открытого списка файлов
+        metadata = pdf_metadata.drain_results()
+        if metadata:
+            eel.on_pdf_metadata(metadata)
+        eel.sleep(0.25)
+
 
 if __name__ == "__main__":
     try:
+        _start_pdf_index(_read_config().get("indexRoots"))
+        eel.spawn(_push_job_events)
         eel.start('index.html',
                   size=(1200, 800),
                   mode='chrome',
                   cmdline_args=['--start-maximized', '--disable-features=TranslateUI'])
     except KeyboardInterrupt:
         print("\nПриложение завершено пользователем")
+    finally:
+        job_manager.shutdown()
+        pdf_metadata.shutdown()
+        if pdf_index is not None:
+            pdf_index.stop()
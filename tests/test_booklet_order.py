@@ -0,0 +1,113 @@
+import itertools
+import unittest
+from math import ceil
+
+from web.scripts.booklet_order import (iter_sheet_sides, sheet_count, sheet_side, signature_ranges,
+                                       total_sheet_count)
+
+# Проверка на всех количествах страниц до MAX_PAGES включительно
+MAX_PAGES = 2000
+# Тетради проверяются на меньшем диапазоне: раскладка внутри тетради - та же, что у буклета
+MAX_SIGNATURE_PAGES = 400
+SIGNATURE_SIZES = (1, 2, 3, 5, 8)
+ROTATIONS = list(itertools.product((False, True), repeat=2))
+
+
+def reference_booklet_order(total_pages, rotate_all, rotate):
+    """Прежний алгоритм calculate_booklet_order (матрица 4 x N): эталон для проверки"""
+    if total_pages <= 0:
+        return []
+    num_rows = ceil(total_pages / 4)
+    matrix = [[None, None, None, None] for _ in range(num_rows)]
+    current_page = 1
+
+    # Четные позиции (0 и 2) по возрастанию
+    for i in range(num_rows):
+        for j in range(4):
+            if current_page > total_pages:
+                break
+            if j % 2 == 0:
+                matrix[i][j] = current_page
+                current_page += 1
+        if current_page > total_pages:
+            break
+
+    # Нечетные позиции (3 и 1) с конца
+    for i in range(num_rows - 1, -1, -1):
+        for j in range(3, -1, -1):
+            if current_page > total_pages:
+                break
+            if j % 2 != 0:
+                matrix[i][j] = current_page
+                current_page += 1
+        if current_page > total_pages:
+            break
+
+    flat_list = [page for row in matrix for page in row]
+    pairs = [flat_list[i:i + 2] for i in range(0, len(flat_list), 2)]
+    if rotate_all:
+        for pair in pairs:
+            pair[0], pair[1] = pair[1], pair[0]
+    if rotate:
+        for pair in pairs[1::2]:
+            pair[0], pair[1] = pair[1], pair[0]
+    # Стороны без страниц не печатаются
+    return [tuple(pair) for pair in pairs if pair[0] is not None or pair[1] is not None]
+
+
+def reference_signature_order(total_pages, rotate_all, rotate, signature_sheets):
+    """Эталон для тетрадей: прежний алгоритм, примененный к каждой тетради со сдвигом номеров страниц"""
+    sides = []
+    for offset in range(0, total_pages, 4 * signature_sheets):
+        pages = min(4 * signature_sheets, total_pages - offset)
+        sides.extend(((left and left + offset), (right and right + offset))
+                     for left, right in reference_booklet_order(pages, rotate_all, rotate))
+    return sides
+
+
+class BookletOrderTest(unittest.TestCase):
+    def assert_order(self, expected, total_pages, rotate_all, rotate, signature_sheets=None):
+        context = dict(total_pages=total_pages, rotate_all=rotate_all, rotate=rotate,
+                       signature_sheets=signature_sheets)
+        self.assertEqual(list(iter_sheet_sides(total_pages, rotate_all, rotate, signature_sheets)), expected,
+                         context)
+        self.assertEqual(total_sheet_count(total_pages, signature_sheets), len(expected), context)
+        self.assertEqual([sheet_side(index, total_pages, rotate_all, rotate, signature_sheets)
+                          for index in range(len(expected))], expected, context)
+        with self.assertRaises(IndexError):
+            sheet_side(len(expected), total_pages, rotate_all, rotate, signature_sheets)
+
+    def test_matches_reference_without_signatures(self):
+        for total_pages in range(0, MAX_PAGES + 1):
+            for rotate_all, rotate in ROTATIONS:
+                expected = reference_booklet_order(total_pages, rotate_all, rotate)
+                self.assert_order(expected, total_pages, rotate_all, rotate)
+            self.assertEqual(sheet_count(total_pages), total_sheet_count(total_pages))
+
+    def test_matches_reference_with_signatures(self):
+        for signature_sheets in SIGNATURE_SIZES:
+            for total_pages in range(0, MAX_SIGNATURE_PAGES + 1):
+                for rotate_all, rotate in ROTATIONS:
+                    expected = reference_signature_order(total_pages, rotate_all, rotate, signature_sheets)
+                    self.assert_order(expected, total_pages, rotate_all, rotate, signature_sheets)
+
+    def test_signature_ranges_cover_all_sides(self):
+        for signature_sheets in (None,) + SIGNATURE_SIZES:
+            for total_pages in range(0, MAX_SIGNATURE_PAGES + 1):
+                ranges = signature_ranges(total_pages, signature_sheets)
+                sides = [index for sides in ranges for index in sides]
+                self.assertEqual(sides, list(range(total_sheet_count(total_pages, signature_sheets))))
+
+    def test_flips_do_not_change_order(self):
+        # calculate_booklet_order принимает отражения, но они влияют только на изображение листа
+        from web.scripts.PDFcreator import PDFBookletCreator
+        creator = PDFBookletCreator("booklet_order_test.pdf", preview_store=None, use_page_cache=False)
+        for total_pages in (1, 2, 3, 5, 8, 13, 64, 101):
+            for rotate_all, rotate, flip_horizontal, flip_vertical in itertools.product((False, True), repeat=4):
+                self.assertEqual(
+                    creator.calculate_booklet_order(total_pages, rotate_all, rotate, flip_horizontal, flip_vertical),
+                    reference_booklet_order(total_pages, rotate_all, rotate))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageChops, ImageStat
+
+from web.scripts.PDFcreator import BACKEND_RASTER, BACKEND_VECTOR, PDFBookletCreator
+
+# Допустимое среднее отличие листов векторного и растрового режимов (0-255):
+# сглаживание и сжатие растровых листов дают доли единицы, перевернутая страница - десятки
+MAX_MEAN_DIFF = 3
+# Масштаб рендеринга листов для сравнения
+COMPARE_ZOOM = 0.5
+
+
+def _draw_marks(page: fitz.Page) -> None:
+    # Несимметричные метки: по ним виден любой поворот или отражение страницы
+    rect = page.rect
+    page.draw_rect(fitz.Rect(10, 10, rect.width / 2, rect.height / 3), color=(1, 0, 0), fill=(1, 0, 0))
+    page.draw_rect(fitz.Rect(rect.width - 60, rect.height - 120, rect.width - 10, rect.height - 10),
+                   color=(0, 0, 1), fill=(0, 0, 1))
+    page.insert_text((40, rect.height / 2), f"P{page.number + 1}", fontsize=40)
+
+
+def _render_sheets(pdf_path: str) -> list:
+    with fitz.open(pdf_path) as booklet:
+        sheets = []
+        for sheet in booklet:
+            pix = sheet.get_pixmap(matrix=fitz.Matrix(COMPARE_ZOOM, COMPARE_ZOOM), alpha=False)
+            sheets.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+        return sheets
+
+
+class VectorMatchesRasterTest(unittest.TestCase):
+    """Векторный режим раскладывает страницы так же, как растровый"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _assert_backends_match(self, pdf_path: str, **layout) -> None:
+        outputs = {}
+        for backend in (BACKEND_VECTOR, BACKEND_RASTER):
+            output_path = os.path.join(self.tmp_dir, f"{backend}.pdf")
+            creator = PDFBookletCreator(pdf_path, output_path, use_page_cache=False, preview_store=None)
+            creator.create_booklet(rotate_all=layout.get("rotate_all", False), rotate=layout.get("rotate", False),
+                                   flip_horizontal=layout.get("flip_horizontal", False),
+                                   flip_vertical=layout.get("flip_vertical", False), backend=backend)
+            outputs[backend] = _render_sheets(output_path)
+
+        self.assertEqual(len(outputs[BACKEND_VECTOR]), len(outputs[BACKEND_RASTER]))
+        for index, (vector, raster) in enumerate(zip(outputs[BACKEND_VECTOR], outputs[BACKEND_RASTER])):
+            diff = ImageStat.Stat(ImageChops.difference(vector, raster)).mean
+            self.assertLess(max(diff), MAX_MEAN_DIFF, f"лист {index + 1}: {diff}")
+
+    def test_rotated_pages(self):
+        # Книжные и альбомные страницы со всеми значениями /Rotate и страница с CropBox
+        pdf_path = os.path.join(self.tmp_dir, "rotated.pdf")
+        with fitz.open() as doc:
+            for (width, height), rotation in [((595, 842), 0), ((595, 842), 90), ((595, 842), 180),
+                                              ((595, 842), 270), ((842, 595), 0), ((842, 595), 90),
+                                              ((842, 595), 270), ((842, 595), 180)]:
+                page = doc.new_page(width=width, height=height)
+                _draw_marks(page)
+                page.set_rotation(rotation)
+            page = doc.new_page(width=595, height=842)
+            _draw_marks(page)
+            page.set_cropbox(fitz.Rect(0, 0, 500, 700))
+            page.set_rotation(90)
+            doc.save(pdf_path)
+
+        self._assert_backends_match(pdf_path)
+        self._assert_backends_match(pdf_path, rotate_all=True, rotate=True, flip_horizontal=True, flip_vertical=True)
+
+    def test_annotations_and_form_fields(self):
+        # Аннотация FreeText и заполненное текстовое поле формы, в том числе на повернутой странице
+        pdf_path = os.path.join(self.tmp_dir, "annotated.pdf")
+        with fitz.open() as doc:
+            for page_num in range(4):
+                page = doc.new_page(width=595, height=842)
+                _draw_marks(page)
+            annot = doc[0].add_freetext_annot(fitz.Rect(100, 300, 400, 400), "FREETEXT NOTE", fontsize=24,
+                                              fill_color=(1, 1, 0))
+            annot.update()
+            widget = fitz.Widget()
+            widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+            widget.field_name = "name"
+            widget.field_value = "FILLED VALUE"
+            widget.text_fontsize = 20
+            widget.rect = fitz.Rect(100, 500, 400, 560)
+            doc[1].add_widget(widget)
+            doc[1].set_rotation(90)
+            doc.save(pdf_path)
+
+        self._assert_backends_match(pdf_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from typing import Optional
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from web.scripts.raster_writer import SHEET_BILEVEL, SHEET_GRAY, classify_sheet
+
+# Разрешение рендеринга, как у растровых листов буклета
+SHEET_DPI = 300
+
+
+def _render_text_page(tint: Optional[float] = None) -> Image.Image:
+    # Страница текста; tint - яркость заливки (0-1) под частью страницы
+    doc = fitz.open()
+    page = doc.new_page()
+    if tint is not None:
+        page.draw_rect(fitz.Rect(50, 400, 550, 700), color=None, fill=(tint, tint, tint))
+    for line in range(30):
+        page.insert_text((50, 60 + line * 13), "The quick brown fox jumps over the lazy dog 0123", fontsize=11)
+    pix = page.get_pixmap(dpi=SHEET_DPI)
+    doc.close()
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+class ClassifySheetTest(unittest.TestCase):
+    """Режим auto сохраняет светлые заливки: такие листы не переводятся в черно-белые"""
+
+    def test_text_is_bilevel(self):
+        self.assertEqual(classify_sheet(_render_text_page()), SHEET_BILEVEL)
+
+    def test_light_tint_is_gray(self):
+        for tint in (0.75, 0.88, 0.95):
+            with self.subTest(tint=tint):
+                self.assertEqual(classify_sheet(_render_text_page(tint)), SHEET_GRAY)
+
+    def test_lossless_keeps_any_tint(self):
+        self.assertEqual(classify_sheet(_render_text_page(0.95).convert("L"), lossy=False), SHEET_GRAY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,6 +7,23 @@ let previewInterval = null;
 let lastOutputPath = "";
 let currentPageIndex = 0;
 let galleryPages = [];
+// Превью запрашиваются по мере просмотра: видимый лист, затем соседние.
+// Загруженные изображения соседних листов хранятся в небольшом LRU (Map в порядке использования)
+const GALLERY_PREFETCH_RADIUS = 2;
+const GALLERY_CACHE_SIZE = 8;
+const galleryImageCache = new Map();
+let currentJobId = null;
+const jobWaiters = {};
+// Список папки загружается страницами; следующая страница - при прокрутке к концу списка
+const FILE_LIST_PAGE_SIZE = 200;
+// Поиск при вводе запускается, когда пользователь перестал печатать (мс)
+const SEARCH_DEBOUNCE_MS = 150;
+let directoryRequestId = 0;
+let directoryListing = null;
+let searchDebounceTimer = null;
+// Элементы открытого списка по пути - для сведений о PDF, которые приходят с сервера позже
+const fileItemsByPath = new Map();
+const finishedJobs = {};
 
 // ============ ФУНКЦИИ ФАЙЛОВОГО БРАУЗЕРА ============
 
@@ -22,6 +39,7 @@ async function openFileBrowser(type) {
     outputNameContainer.style.display = type === 'output' ? "flex" : "none";
     pdfOnlyCheckbox.disabled = type === 'output';
     pdfOnlyCheckbox.checked = type === 'input';
+    document.getElementById("search-everywhere").disabled = type === 'output';
     modal.style.display = "flex";
 
     document.getElementById("search-input").value = "";
@@ -72,22 +90,75 @@ function updateOutputFilePath() {
 
 // Загрузка директории с фильтрами
 async function loadDirectoryWithFilters() {
+    clearTimeout(searchDebounceTimer);
     const searchQuery = document.getElementById("search-input").value;
     const onlyPdf = document.getElementById("pdf-only").checked && selectionType === 'input';
-    loadDirectory(currentPath, searchQuery, onlyPdf);
+    const everywhere = document.getElementById("search-everywhere").checked && selectionType === 'input';
+    if (everywhere && searchQuery.trim()) {
+        searchPdfIndex(searchQuery);
+    } else {
+        loadDirectory(currentPath, searchQuery, onlyPdf);
+    }
+}
+
+// Поиск PDF во всех проиндексированных папках (фоновый индекс на сервере)
+async function searchPdfIndex(searchQuery) {
+    const requestId = ++directoryRequestId;
+    const result = await eel.search_pdf_index(searchQuery)();
+    if (requestId !== directoryRequestId) return;
+    const fileList = document.getElementById("file-list");
+    fileList.innerHTML = "";
+    fileList.scrollTop = 0;
+    fileItemsByPath.clear();
+
+    if (result.status !== "success" || result.results.length === 0) {
+        directoryListing = null;
+        const messageDiv = document.createElement("div");
+        messageDiv.innerText = result.status === "success" ? "Файлы не найдены." : result.message;
+        messageDiv.style.color = result.status === "success" ? "#777" : "#ff4444";
+        messageDiv.style.textAlign = "center";
+        messageDiv.style.padding = "20px";
+        fileList.appendChild(messageDiv);
+        return;
+    }
+
+    directoryListing = { searchQuery, onlyPdf: true, loaded: 0, total: result.results.length, loading: false };
+    appendDirectoryItems({
+        contents: result.results.map(item => ({
+            name: item.name,
+            path: item.path,
+            is_dir: false,
+            is_pdf: true,
+            detail: item.path
+        })),
+        total: result.results.length,
+        has_more: false
+    });
+}
+
+// Поиск при вводе: один запрос после паузы вместо запроса на каждое нажатие
+function scheduleDirectorySearch() {
+    clearTimeout(searchDebounceTimer);
+    searchDebounceTimer = setTimeout(loadDirectoryWithFilters, SEARCH_DEBOUNCE_MS);
 }
 
-// Загрузка содержимого директории
+// Загрузка содержимого директории (первая страница)
 async function loadDirectory(path, searchQuery = "", onlyPdf = false) {
-    const result = await eel.get_directory_contents(path, searchQuery, onlyPdf)();
+    const requestId = ++directoryRequestId;
+    const result = await eel.get_directory_contents(path, searchQuery, onlyPdf, 0, FILE_LIST_PAGE_SIZE)();
+    // Ответ на устаревший запрос (пользователь продолжил ввод или сменил папку)
+    if (requestId !== directoryRequestId) return;
     const fileList = document.getElementById("file-list");
     
     if (result.status === "success") {
         currentPath = result.path;
         document.getElementById("current-path").innerText = currentPath;
         fileList.innerHTML = "";
+        fileList.scrollTop = 0;
+        fileItemsByPath.clear();
+        directoryListing = { searchQuery, onlyPdf, loaded: 0, total: result.total, loading: false };
 
-        if (result.contents.length === 0) {
+        if (result.total === 0) {
             const emptyDiv = document.createElement("div");
             emptyDiv.innerText = "Папка пуста или файлы не найдены.";
             emptyDiv.style.color = "#777";
@@ -97,40 +168,9 @@ async function loadDirectory(path, searchQuery = "", onlyPdf = false) {
             return;
         }
 
-        result.contents.forEach(item => {
-            const div = document.createElement("div");
-            div.className = "file-item";
-            if (item.is_pdf) {
-                div.classList.add("pdf");
-            }
-
-            const icon = document.createElement("span");
-            icon.className = "file-icon";
-            icon.innerText = item.is_dir ? "📁" : (item.is_pdf ? "📄" : "🗎");
-
-            const nameSpan = document.createElement("span");
-            nameSpan.innerText = item.name;
-
-            div.appendChild(icon);
-            div.appendChild(nameSpan);
-
-            div.onclick = () => {
-                if (item.is_dir) {
-                    loadDirectory(item.path, searchQuery, onlyPdf);
-                } else if (item.is_pdf && selectionType === 'input') {
-                    document.getElementById("input-file").value = item.path;
-                    updateOutputFilePath();
-                    closeFileBrowser();
-                } else if (selectionType === 'output') {
-                    selectedItemPath = item.is_dir ? item.path : item.path;
-                    const defaultName = item.is_pdf ? item.name : "booklet_output.pdf";
-                    document.getElementById("output-name").value = defaultName;
-                }
-            };
-
-            fileList.appendChild(div);
-        });
+        appendDirectoryItems(result);
     } else {
+        directoryListing = null;
         fileList.innerHTML = "";
         const errorDiv = document.createElement("div");
         errorDiv.innerText = result.message;
@@ -141,6 +181,116 @@ async function loadDirectory(path, searchQuery = "", onlyPdf = false) {
     }
 }
 
+// Следующая страница содержимого текущей директории
+async function loadMoreDirectoryItems() {
+    const listing = directoryListing;
+    if (!listing || listing.loading || listing.loaded >= listing.total) return;
+    listing.loading = true;
+    const requestId = directoryRequestId;
+    const result = await eel.get_directory_contents(currentPath, listing.searchQuery, listing.onlyPdf,
+                                                    listing.loaded, FILE_LIST_PAGE_SIZE)();
+    listing.loading = false;
+    if (requestId !== directoryRequestId || result.status !== "success") return;
+    appendDirectoryItems(result);
+}
+
+// Добавление страницы элементов в список файлов
+function appendDirectoryItems(result) {
+    const fileList = document.getElementById("file-list");
+    const { searchQuery, onlyPdf } = directoryListing;
+    const fragment = document.createDocumentFragment();
+
+    result.contents.forEach(item => {
+        const div = document.createElement("div");
+        div.className = "file-item";
+        if (item.is_pdf) {
+            div.classList.add("pdf");
+        }
+
+        const icon = document.createElement("span");
+        icon.className = "file-icon";
+        icon.innerText = item.is_dir ? "📁" : (item.is_pdf ? "📄" : "🗎");
+
+        const nameSpan = document.createElement("span");
+        nameSpan.innerText = item.name;
+
+        div.appendChild(icon);
+        div.appendChild(nameSpan);
+        if (item.detail) {
+            const detailSpan = document.createElement("span");
+            detailSpan.className = "file-detail";
+            detailSpan.dataset.base = item.detail;
+            detailSpan.innerText = item.detail;
+            div.appendChild(detailSpan);
+        }
+        if (item.is_pdf) {
+            fileItemsByPath.set(item.path, div);
+        }
+
+        div.onclick = () => {
+            if (item.is_dir) {
+                loadDirectory(item.path, searchQuery, onlyPdf);
+            } else if (item.is_pdf && selectionType === 'input') {
+                document.getElementById("input-file").value = item.path;
+                updateOutputFilePath();
+                closeFileBrowser();
+            } else if (selectionType === 'output') {
+                selectedItemPath = item.is_dir ? item.path : item.path;
+                const defaultName = item.is_pdf ? item.name : "booklet_output.pdf";
+                document.getElementById("output-name").value = defaultName;
+            }
+        };
+
+        fragment.appendChild(div);
+    });
+
+    const oldFooter = fileList.querySelector(".file-list-more");
+    if (oldFooter) oldFooter.remove();
+    fileList.appendChild(fragment);
+    directoryListing.loaded += result.contents.length;
+    directoryListing.total = result.total;
+
+    if (result.has_more) {
+        const footer = document.createElement("div");
+        footer.className = "file-list-more";
+        footer.innerText = `Показано ${directoryListing.loaded} из ${directoryListing.total}. Прокрутите вниз или нажмите, чтобы загрузить еще`;
+        footer.onclick = loadMoreDirectoryItems;
+        fileList.appendChild(footer);
+    }
+}
+
+// Сведения о PDF (страницы, размер первой страницы, миниатюра) по мере готовности на сервере
+function onPdfMetadata(items) {
+    items.forEach(metadata => {
+        const div = fileItemsByPath.get(metadata.path);
+        if (!div || metadata.error) return;
+
+        if (metadata.thumbnail) {
+            const thumbnail = document.createElement("img");
+            thumbnail.className = "file-thumbnail";
+            thumbnail.src = metadata.thumbnail;
+            thumbnail.alt = "";
+            div.querySelector(".file-icon").replaceWith(thumbnail);
+        }
+
+        const info = [];
+        if (metadata.pages) info.push(`стр.: ${metadata.pages}`);
+        if (metadata.width_mm && metadata.height_mm) info.push(`${metadata.width_mm}×${metadata.height_mm} мм`);
+        if (info.length === 0) return;
+        let detailSpan = div.querySelector(".file-detail");
+        if (!detailSpan) {
+            detailSpan = document.createElement("span");
+            detailSpan.className = "file-detail";
+            div.appendChild(detailSpan);
+        }
+        detailSpan.dataset.metadata = info.join(" · ");
+        detailSpan.innerText = detailSpan.dataset.base
+            ? `${detailSpan.dataset.base} · ${detailSpan.dataset.metadata}`
+            : detailSpan.dataset.metadata;
+    });
+}
+eel.expose(onPdfMetadata, "on_pdf_metadata");
+
 // Подтверждение выбора выходного файла
 function confirmOutputSelection() {
     if (selectionType === 'output' && selectedItemPath) {
@@ -271,24 +421,155 @@ function updatePdfPreview(filePath) {
     pdfFrame.src = safeFilePath + "?t=" + new Date().getTime();
 }
 
+// Чтение настроек печати из формы
+function getBookletSettings() {
+    return {
+        rotate_all: document.getElementById("rotate-all").checked,
+        rotate: document.getElementById("rotate").checked,
+        flipHorizontal: document.getElementById("flip-horizontal").checked,
+        flipVertical: document.getElementById("flip-vertical").checked,
+        // 0 - весь документ одним буклетом
+        signatureSheets: parseInt(document.getElementById("signature-sheets").value, 10) || 0,
+        // Режим экспорта и потолок памяти окна страниц потокового режима
+        backend: document.getElementById("export-backend").value,
+        memoryLimitMb: parseInt(document.getElementById("memory-limit").value, 10) || 0
+    };
+}
+
+// Проверка путей перед подготовкой или экспортом
+function validateBookletPaths(inputPath, outputPath, statusElement) {
+    if (!inputPath) {
+        statusElement.innerText = "Ошибка: выберите входной файл!";
+        statusElement.className = "status error";
+        statusElement.style.display = "block";
+        logAction('Ошибка валидации: входной файл не выбран', 'error');
+        return false;
+    }
+
+    if (!outputPath) {
+        statusElement.innerText = "Ошибка: укажите путь для выходного файла!";
+        statusElement.className = "status error";
+        statusElement.style.display = "block";
+        logAction('Ошибка валидации: путь для выходного файла не указан', 'error');
+        return false;
+    }
+    return true;
+}
+
+// ============ ФОНОВЫЕ ЗАДАНИЯ ============
+
+// Форматирование размера в байтах
+function formatBytes(bytes) {
+    if (bytes < 1024) return `${bytes} Б`;
+    if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} КБ`;
+    return `${(bytes / (1024 * 1024)).toFixed(1)} МБ`;
+}
+
+// Отображение прогресса задания
+function updateJobProgress(job) {
+    const progressFill = document.getElementById("progress-fill");
+    const progressText = document.getElementById("progress-text");
+    const progress = job.progress || {};
+
+    if (progress.total_sheets) {
+        const percent = Math.min(100, Math.round(progress.sheets_composed / progress.total_sheets * 100));
+        progressFill.style.width = `${percent}%`;
+    }
+
+    if (job.status === "queued") {
+        progressText.innerText = "В очереди...";
+    } else if (job.status === "running") {
+        const totalSheets = progress.total_sheets ? `/${progress.total_sheets}` : "";
+        progressText.innerText = `Листов: ${progress.sheets_composed}${totalSheets} · ` +
+            `страниц: ${progress.pages_rendered} · записано: ${formatBytes(progress.bytes_written)}`;
+    }
+}
+
+// Событие прогресса от сервера
+function onJobProgress(job) {
+    if (job.job_id === currentJobId) {
+        updateJobProgress(job);
+    }
+
+    if (["done", "error", "cancelled"].includes(job.status)) {
+        if (jobWaiters[job.job_id]) {
+            jobWaiters[job.job_id](job);
+            delete jobWaiters[job.job_id];
+        } else {
+            finishedJobs[job.job_id] = job;
+        }
+    }
+}
+eel.expose(onJobProgress, "on_job_progress");
+
+// Ожидание завершения задания
+function waitForJob(jobId) {
+    return new Promise(resolve => {
+        if (finishedJobs[jobId]) {
+            resolve(finishedJobs[jobId]);
+            delete finishedJobs[jobId];
+        } else {
+            jobWaiters[jobId] = resolve;
+        }
+    });
+}
+
+// Запуск задания и ожидание результата
+async function runBookletJob(kind, args) {
+    const cancelBtn = document.getElementById("cancel-btn");
+    const started = await eel.start_booklet_job(kind, ...args)();
+    if (started.status !== "success") {
+        return started;
+    }
+
+    currentJobId = started.job_id;
+    cancelBtn.style.display = "block";
+    document.getElementById("progress-fill").style.width = "0%";
+    logAction('Задание запущено', 'info', { jobId: started.job_id, kind: kind });
+
+    try {
+        const job = await waitForJob(started.job_id);
+        if (job.status === "done") {
+            return job.result;
+        }
+        if (job.status === "cancelled") {
+            return { status: "error", message: job.error || "Задание отменено." };
+        }
+        return { status: "error", message: job.error || "Ошибка выполнения задания" };
+    } finally {
+        currentJobId = null;
+        cancelBtn.style.display = "none";
+    }
+}
+
+// Отмена текущего задания
+async function cancelCurrentJob() {
+    if (!currentJobId) return;
+
+    const result = await eel.cancel_job(currentJobId)();
+    logAction('Отмена задания', 'info', { jobId: currentJobId, message: result.message });
+    if (result.status === "success") {
+        document.getElementById("progress-text").innerText = "Отмена...";
+    }
+}
+
 // ============ ФУНКЦИИ СОЗДАНИЯ БУКЛЕТА ============
 
-// Подготовка буклета
+// Подготовка буклета (быстрое превью без создания итогового PDF)
 async function prepareBooklet() {
     const inputPath = document.getElementById("input-file").value.trim();
     const outputPath = document.getElementById("output-file").value.trim();
     const statusElement = document.getElementById("status");
     const progressText = document.getElementById("progress-text");
     const prepareBtn = document.getElementById("prepare-btn");
+    const exportBtn = document.getElementById("export-btn");
 
-    const rotate_all = document.getElementById("rotate-all").checked;
-    const rotate = document.getElementById("rotate").checked;
-    const flipHorizontal = document.getElementById("flip-horizontal").checked;
-    const flipVertical = document.getElementById("flip-vertical").checked;
+    const { rotate_all, rotate, flipHorizontal, flipVertical, signatureSheets } = getBookletSettings();
 
     // Очистка и инициализация галереи
     galleryPages = [];
     currentPageIndex = 0;
+    exportBtn.disabled = true;
 
     const galleryTrack = document.getElementById('gallery-track');
     if (galleryTrack) {
@@ -305,41 +586,89 @@ async function prepareBooklet() {
     logAction('Начало подготовки буклета', 'info', {
         inputPath: inputPath,
         outputPath: outputPath,
-        settings: { rotate_all, rotate, flipHorizontal, flipVertical }
+        settings: { rotate_all, rotate, flipHorizontal, flipVertical, signatureSheets }
     });
 
     // Валидация
-    if (!inputPath) {
-        statusElement.innerText = "Ошибка: выберите входной файл!";
-        statusElement.className = "status error";
-        statusElement.style.display = "block";
-        logAction('Ошибка валидации: входной файл не выбран', 'error');
+    if (!validateBookletPaths(inputPath, outputPath, statusElement)) {
         return;
     }
 
-    if (!outputPath) {
-        statusElement.innerText = "Ошибка: укажите путь для выходного файла!";
+    // Показ прогресса
+    progressText.innerText = "Обработка...";
+    prepareBtn.disabled = true;
+    statusElement.className = "status info";
+    statusElement.style.display = "block";
+    statusElement.innerText = "Начинаю обработку...";
+
+    try {
+        logAction('Вызов функции создания превью буклета', 'info');
+        const result = await runBookletJob('preview', [inputPath, outputPath, rotate_all, rotate, flipHorizontal, flipVertical, signatureSheets]);
+
+        if (result.status === "success") {
+            statusElement.className = "status success";
+            progressText.innerText = "Превью готово";
+            exportBtn.disabled = false;
+            logAction('Превью буклета создано', 'success', { totalPages: result.total_pages });
+
+            // Обновление галереи
+            if (result.gallery_pages && result.gallery_pages.length > 0) {
+                addPagesToGallery(result.gallery_pages);
+                logAction(`Галерея обновлена с ${result.gallery_pages.length} страницами`, 'info');
+            }
+        } else {
+            statusElement.className = "status error";
+            progressText.innerText = "Ошибка";
+            logAction('Ошибка при создании превью буклета', 'error', { message: result.message });
+        }
+
+        statusElement.innerText = result.message;
+    } catch (error) {
         statusElement.className = "status error";
-        statusElement.style.display = "block";
-        logAction('Ошибка валидации: путь для выходного файла не указан', 'error');
+        statusElement.innerText = `Ошибка выполнения: ${error.message}`;
+        progressText.innerText = "Ошибка";
+        logError(error, 'При создании превью буклета');
+    } finally {
+        prepareBtn.disabled = false;
+        logAction('Завершение подготовки превью', 'info');
+    }
+}
+
+// Экспорт итогового PDF в полном разрешении после подтверждения превью
+async function exportBooklet() {
+    const inputPath = document.getElementById("input-file").value.trim();
+    const outputPath = document.getElementById("output-file").value.trim();
+    const statusElement = document.getElementById("status");
+    const progressText = document.getElementById("progress-text");
+    const prepareBtn = document.getElementById("prepare-btn");
+    const exportBtn = document.getElementById("export-btn");
+
+    const { rotate_all, rotate, flipHorizontal, flipVertical, signatureSheets, backend, memoryLimitMb } = getBookletSettings();
+
+    if (!validateBookletPaths(inputPath, outputPath, statusElement)) {
         return;
     }
 
-    // Показ прогресса
-    progressText.innerText = "Обработка...";
+    progressText.innerText = "Экспорт...";
     prepareBtn.disabled = true;
+    exportBtn.disabled = true;
     statusElement.className = "status info";
     statusElement.style.display = "block";
-    statusElement.innerText = "Начинаю обработку...";
+    statusElement.innerText = "Создание итогового PDF...";
 
     try {
-        logAction('Вызов функции создания буклета', 'info');
-        const result = await eel.create_booklet(inputPath, outputPath, rotate_all, rotate, flipHorizontal, flipVertical)();
+        logAction('Вызов функции экспорта буклета', 'info');
+        const result = await runBookletJob('export', [inputPath, outputPath, rotate_all, rotate, flipHorizontal, flipVertical, signatureSheets, backend, memoryLimitMb]);
 
         if (result.status === "success") {
             statusElement.className = "status success";
             progressText.innerText = "Готово!";
-            logAction('Буклет успешно создан', 'success', { resultPath: result.result_path });
+            logAction('Буклет успешно создан', 'success', {
+                resultPath: result.result_path,
+                backend: result.backend,
+                memoryLimitBytes: result.memory_limit_bytes,
+                peakWindowBytes: result.peak_window_bytes
+            });
 
             // Обновление превью PDF
             if (result.result_path) {
@@ -360,7 +689,6 @@ async function prepareBooklet() {
             // Обновление галереи
             if (result.gallery_pages && result.gallery_pages.length > 0) {
                 addPagesToGallery(result.gallery_pages);
-                logAction(`Галерея обновлена с ${result.gallery_pages.length} страницами`, 'info');
             }
         } else {
             statusElement.className = "status error";
@@ -376,6 +704,7 @@ async function prepareBooklet() {
         logError(error, 'При создании буклета');
     } finally {
         prepareBtn.disabled = false;
+        exportBtn.disabled = false;
         logAction('Завершение обработки буклета', 'info');
     }
 }
@@ -427,14 +756,57 @@ function updateGalleryDisplay() {
                     <i class="fas ${pageItem.isBackSide ? 'fa-undo' : 'fa-file-alt'}"></i>
                     ${sideText}
                 </div>
-                <img src="${pageItem.src}" alt="Страница ${pageItem.pageNumber}" class="gallery-image">
+                <img src="${pageItem.src || ''}" alt="Страница ${pageItem.pageNumber}" class="gallery-image">
                 <div class="gallery-page-info">
                     <div>Страница буклета: ${pageItem.pageNumber} / ${galleryPages.length}</div>
                     <div class="page-numbers">${pageInfo}</div>
                 </div>
             </div>
         `;
+
+        // Соседние листы загружаются только после видимого, чтобы не задерживать его
+        const shownIndex = currentPageIndex;
+        const image = galleryTrack.querySelector('.gallery-image');
+        cacheGalleryImage(pageItem.src);
+        const prefetch = () => {
+            if (shownIndex === currentPageIndex) prefetchGalleryNeighbours(shownIndex);
+        };
+        if (image.complete) {
+            prefetch();
+        } else {
+            image.addEventListener('load', prefetch, { once: true });
+        }
+    }
+}
+
+// Загрузка превью листа в LRU изображений галереи
+function cacheGalleryImage(src) {
+    if (!src) return;
+    let image = galleryImageCache.get(src);
+    if (image) {
+        galleryImageCache.delete(src);
+    } else {
+        image = new Image();
+        image.decoding = 'async';
+        image.src = src;
+    }
+    galleryImageCache.set(src, image);
+    while (galleryImageCache.size > GALLERY_CACHE_SIZE) {
+        galleryImageCache.delete(galleryImageCache.keys().next().value);
+    }
+}
+
+// Предзагрузка соседних листов, ближайшие - первыми
+function prefetchGalleryNeighbours(index) {
+    for (let offset = 1; offset <= GALLERY_PREFETCH_RADIUS; offset++) {
+        for (const neighbour of [index + offset, index - offset]) {
+            if (neighbour >= 0 && neighbour < galleryPages.length) {
+                cacheGalleryImage(galleryPages[neighbour].src);
+            }
+        }
     }
+    // Видимый лист остается самым свежим в LRU
+    cacheGalleryImage(galleryPages[index].src);
 }
 
 // Навигация по галерее
@@ -462,6 +834,7 @@ function addPagesToGallery(pages) {
         rightPage: pageData.right_page_num
     }));
 
+    galleryImageCache.clear();
     currentPageIndex = 0;
     updateGalleryDisplay();
 }
@@ -478,6 +851,9 @@ function saveSettings() {
             rotate: document.getElementById("rotate").checked,
             flipHorizontal: document.getElementById("flip-horizontal").checked,
             flipVertical: document.getElementById("flip-vertical").checked,
+            signatureSheets: parseInt(document.getElementById("signature-sheets").value, 10) || 0,
+            backend: document.getElementById("export-backend").value,
+            memoryLimitMb: parseInt(document.getElementById("memory-limit").value, 10) || 0,
             timestamp: new Date().toISOString()
         };
 
@@ -572,6 +948,15 @@ function applySettings(settings) {
         if (typeof settings.flipVertical === 'boolean') {
             document.getElementById("flip-vertical").checked = settings.flipVertical;
         }
+        if (typeof settings.signatureSheets === 'number') {
+            document.getElementById("signature-sheets").value = settings.signatureSheets;
+        }
+        if (typeof settings.backend === 'string') {
+            document.getElementById("export-backend").value = settings.backend;
+        }
+        if (typeof settings.memoryLimitMb === 'number' && settings.memoryLimitMb > 0) {
+            document.getElementById("memory-limit").value = settings.memoryLimitMb;
+        }
 
         console.log("Настройки успешно загружены");
     } catch (error) {
@@ -589,6 +974,9 @@ function setupAutoSave() {
     document.getElementById("rotate").addEventListener("change", saveSettings);
     document.getElementById("flip-horizontal").addEventListener("change", saveSettings);
     document.getElementById("flip-vertical").addEventListener("change", saveSettings);
+    document.getElementById("signature-sheets").addEventListener("change", saveSettings);
+    document.getElementById("export-backend").addEventListener("change", saveSettings);
+    document.getElementById("memory-limit").addEventListener("change", saveSettings);
 }
 
 // ============ ФУНКЦИИ ЛОГИРОВАНИЯ ============
@@ -870,6 +1258,12 @@ document.getElementById("search-input").addEventListener("keypress", function(ev
     }
 });
 
+document.getElementById("file-list").addEventListener("scroll", function() {
+    if (this.scrollTop + this.clientHeight >= this.scrollHeight - 200) {
+        loadMoreDirectoryItems();
+    }
+});
+
 document.getElementById("file-browser-modal").addEventListener("click", function(event) {
     if (event.target === this) {
         closeFileBrowser();
@@ -1,17 +1,155 @@
 import html
 import os
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+# Сколько элементов папки сразу попадает на страницу; остальные лежат в шаблонах
+# и добавляются при прокрутке, чтобы страница большой папки открывалась быстро
+FOLDER_PAGE_SIZE = 300
+
+# Иконки файлов по расширению
+_FILE_ICONS = {}
+for _icon, _extensions in (
+        ("fa-file-alt", (".txt", ".md", ".rtf")),
+        ("fa-file-image", (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".svg")),
+        ("fa-file-video", (".mp4", ".avi", ".mov", ".mkv")),
+        ("fa-file-audio", (".mp3", ".wav", ".flac")),
+        ("fa-file-pdf", (".pdf",)),
+        ("fa-file-word", (".doc", ".docx")),
+        ("fa-file-excel", (".xls", ".xlsx")),
+        ("fa-file-archive", (".zip", ".rar", ".7z", ".tar", ".gz")),
+        ("fa-file-code", (".py", ".js", ".html", ".css", ".java", ".cpp"))):
+    _FILE_ICONS.update(dict.fromkeys(_extensions, f'<i class="fas {_icon}"></i>'))
+_DEFAULT_FILE_ICON = '<i class="fas fa-file"></i>'
+_FOLDER_ICON = '<i class="fas fa-folder"></i>'
+
+
+class FolderItem(NamedTuple):
+    name: str
+    path: str
+    is_dir: bool
+    # Размер файла в байтах; None - для папок и недоступных файлов
+    size: Optional[int]
+
+
+def scan_folder(folder_path: str) -> List[FolderItem]:
+    """Содержимое папки за один проход os.scandir, сначала папки, потом файлы.
+    Тип и размер берутся из кэшированных данных DirEntry (на Windows они приходят
+    вместе со списком папки, на остальных системах - один stat на файл)."""
+    items = []
+    with os.scandir(folder_path) as iterator:
+        for entry in iterator:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            size = None
+            if not is_dir:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    pass
+            items.append(FolderItem(entry.name, entry.path, is_dir, size))
+    items.sort(key=lambda item: (not item.is_dir, item.name.lower()))
+    return items
+
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} Б"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} КБ"
+    if size < 1024 * 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} МБ"
+    return f"{size / (1024 * 1024 * 1024):.1f} ГБ"
+
+
+def _item_html(item: FolderItem) -> str:
+    escaped_item = html.escape(item.name)
+    if item.is_dir:
+        icon = _FOLDER_ICON
+        item_class = 'folder'
+        size_info = '<div class="item-size">Папка</div>'
+    else:
+        icon = _FILE_ICONS.get(os.path.splitext(item.name)[1].lower(), _DEFAULT_FILE_ICON)
+        item_class = 'file'
+        if item.size is None:
+            size_info = '<div class="item-size">Недоступно</div>'
+        else:
+            size_info = f'<div class="item-size">{html.escape(_format_size(item.size))}</div>'
+    return f'''
+                <a href="file://{html.escape(item.path)}" class="item {item_class}" title="{escaped_item}">
+                    <div class="item-icon">{icon}</div>
+                    <div class="item-name">{escaped_item}</div>
+                    {size_info}
+                </a>'''
+
+
+def iter_folder_html(folder_path: str, items: Optional[Iterable[FolderItem]] = None,
+                     page_size: int = FOLDER_PAGE_SIZE) -> Iterator[str]:
+    """Стилизованная HTML-страница с содержимым папки частями - для записи в файл без
+    сборки всей страницы в памяти. Первые page_size элементов выводятся сразу,
+    остальные - шаблонами по page_size, которые страница добавляет при прокрутке."""
+    if items is None:
+        items = scan_folder(folder_path)
+    yield _PAGE_HEAD.format(path=html.escape(folder_path))
+
+    total = folders = 0
+    page: List[str] = []
+    first_page = True
+    for item in items:
+        total += 1
+        folders += item.is_dir
+        page.append(_item_html(item))
+        if len(page) == page_size:
+            yield _page_html(page, first_page)
+            first_page = False
+            page = []
+    if page or first_page:
+        yield _page_html(page, first_page)
+
+    yield _PAGE_TAIL.format(total=total, folders=folders, files=total - folders)
+
+
+def _page_html(page: List[str], first_page: bool) -> str:
+    if first_page:
+        # Первая страница - внутри сетки, после нее сетка закрывается
+        return "".join(page) + _GRID_END
+    return '\n            <template class="item-page">' + "".join(page) + '\n            </template>'
 
-def create_folder_html(folder_path, items):
-    """Создает стилизованную HTML-страницу с содержимым папки"""
 
-    escaped_folder_path = html.escape(folder_path)
+def write_folder_html(output_path: str, folder_path: str, items: Optional[Iterable[FolderItem]] = None) -> None:
+    """Записывает страницу с содержимым папки в файл по мере формирования"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.writelines(iter_folder_html(folder_path, items))
 
-    html_content = f'''<!DOCTYPE html>
+
+def create_folder_html(folder_path, items=None):
+    """Создает стилизованную HTML-страницу с содержимым папки.
+    items - имена элементов в нужном порядке; без них папка читается через scan_folder"""
+    if items is not None:
+        items = [_folder_item(folder_path, name) for name in items]
+    return "".join(iter_folder_html(folder_path, items))
+
+
+def _folder_item(folder_path: str, name: str) -> FolderItem:
+    path = os.path.join(folder_path, name)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return FolderItem(name, path, False, None)
+    is_dir = os.path.isdir(path)
+    return FolderItem(name, path, is_dir, None if is_dir else stat.st_size)
+
+
+_GRID_END = """
+            </div>"""
+
+_PAGE_HEAD = '''<!DOCTYPE html>
 <html lang="ru">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Содержимое папки: {escaped_folder_path}</title>
+    <title>Содержимое папки: {path}</title>
     <style>
         :root {{
             /* Основная цветовая палитра - темно-серые оттенки */
@@ -492,7 +630,7 @@ def create_folder_html(folder_path, items):
     <div class="container">
         <div class="header">
             <h1><i class="fas fa-folder"></i> Содержимое папки</h1>
-            <div class="path">{escaped_folder_path}</div>
+            <div class="path">{path}</div>
         </div>
 
         <div class="controls">
@@ -506,76 +644,13 @@ def create_folder_html(folder_path, items):
             <div class="item-grid" id="itemGrid">
 '''
 
-    # Добавляем элементы
-    for item in items:
-        item_path = os.path.join(folder_path, item)
-        escaped_item = html.escape(item)
-
-        # Определяем тип элемента
-        if os.path.isdir(item_path):
-            icon = '<i class="fas fa-folder"></i>'
-            item_class = 'folder'
-            size_info = '<div class="item-size">Папка</div>'
-        else:
-            # Определяем иконку по расширению
-            ext = os.path.splitext(item)[1].lower()
-            if ext in ['.txt', '.md', '.rtf']:
-                icon = '<i class="fas fa-file-alt"></i>'
-            elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg']:
-                icon = '<i class="fas fa-file-image"></i>'
-            elif ext in ['.mp4', '.avi', '.mov', '.mkv']:
-                icon = '<i class="fas fa-file-video"></i>'
-            elif ext in ['.mp3', '.wav', '.flac']:
-                icon = '<i class="fas fa-file-audio"></i>'
-            elif ext in ['.pdf']:
-                icon = '<i class="fas fa-file-pdf"></i>'
-            elif ext in ['.doc', '.docx']:
-                icon = '<i class="fas fa-file-word"></i>'
-            elif ext in ['.xls', '.xlsx']:
-                icon = '<i class="fas fa-file-excel"></i>'
-            elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
-                icon = '<i class="fas fa-file-archive"></i>'
-            elif ext in ['.py', '.js', '.html', '.css', '.java', '.cpp']:
-                icon = '<i class="fas fa-file-code"></i>'
-            else:
-                icon = '<i class="fas fa-file"></i>'
-
-            item_class = 'file'
-
-            # Получаем размер файла
-            try:
-                size = os.path.getsize(item_path)
-                if size < 1024:
-                    size_str = f"{size} Б"
-                elif size < 1024 * 1024:
-                    size_str = f"{size / 1024:.1f} КБ"
-                elif size < 1024 * 1024 * 1024:
-                    size_str = f"{size / (1024 * 1024):.1f} МБ"
-                else:
-                    size_str = f"{size / (1024 * 1024 * 1024):.1f} ГБ"
-                size_info = f'<div class="item-size">{html.escape(size_str)}</div>'
-            except:
-                size_info = '<div class="item-size">Недоступно</div>'
-
-        escaped_item_path = html.escape(item_path)
-        html_content += f'''
-                <a href="file://{escaped_item_path}" class="item {item_class}" title="{escaped_item}">
-                    <div class="item-icon">{icon}</div>
-                    <div class="item-name">{escaped_item}</div>
-                    {size_info}
-                </a>'''
-
-    # Подсчет статистики
-    folders_count = sum(1 for item in items if os.path.isdir(os.path.join(folder_path, item)))
-    files_count = len(items) - folders_count
-
-    html_content += f'''
-            </div>
+_PAGE_TAIL = '''
+            <div id="itemSentinel"></div>
 
             <div class="stats">
-                <div>Всего элементов: <strong>{len(items)}</strong></div>
-                <div>Папок: <strong>{folders_count}</strong></div>
-                <div>Файлов: <strong>{files_count}</strong></div>
+                <div>Всего элементов: <strong>{total}</strong></div>
+                <div>Папок: <strong>{folders}</strong></div>
+                <div>Файлов: <strong>{files}</strong></div>
             </div>
 
 
@@ -584,9 +659,57 @@ def create_folder_html(folder_path, items):
     </div>
 
     <script>
+        const itemGrid = document.getElementById('itemGrid');
+        // Элементы больших папок лежат в шаблонах и добавляются на страницу по мере прокрутки
+        const itemPages = Array.from(document.querySelectorAll('template.item-page'));
+
+        // Анимация при наведении
+        function bindItems(items) {{
+            items.forEach(item => {{
+                item.addEventListener('mouseenter', function() {{
+                    this.style.transform = 'translateY(-5px) scale(1.02)';
+                }});
+
+                item.addEventListener('mouseleave', function() {{
+                    this.style.transform = 'translateY(0) scale(1)';
+                }});
+            }});
+        }}
+
+        function loadNextPage() {{
+            const page = itemPages.shift();
+            if (!page) return false;
+            const items = Array.from(page.content.querySelectorAll('.item'));
+            itemGrid.appendChild(page.content);
+            page.remove();
+            bindItems(items);
+            return true;
+        }}
+
+        // Поиск и фильтр работают по всем элементам папки
+        function loadAllPages() {{
+            while (loadNextPage()) {{}}
+        }}
+
+        if (itemPages.length) {{
+            const sentinel = document.getElementById('itemSentinel');
+            const observer = new IntersectionObserver(entries => {{
+                if (!entries[0].isIntersecting) return;
+                if (!loadNextPage()) {{
+                    observer.disconnect();
+                    return;
+                }}
+                // Повторное наблюдение проверяет, виден ли конец списка после добавления страницы
+                observer.unobserve(sentinel);
+                observer.observe(sentinel);
+            }}, {{ rootMargin: '600px' }});
+            observer.observe(sentinel);
+        }}
+
         // Функция поиска
         document.getElementById('searchInput').addEventListener('input', function(e) {{
             const searchTerm = e.target.value.toLowerCase();
+            if (searchTerm) loadAllPages();
             const items = document.querySelectorAll('.item');
 
             items.forEach(item => {{
@@ -601,6 +724,7 @@ def create_folder_html(folder_path, items):
 
         // Функция фильтрации
         document.getElementById('filterBtn').addEventListener('click', function() {{
+            loadAllPages();
             const items = document.querySelectorAll('.item');
             const hasHidden = Array.from(items).some(item => item.style.display === 'none');
 
@@ -629,18 +753,7 @@ def create_folder_html(folder_path, items):
             }}
         }});
 
-        // Анимация при наведении
-        document.querySelectorAll('.item').forEach(item => {{
-            item.addEventListener('mouseenter', function() {{
-                this.style.transform = 'translateY(-5px) scale(1.02)';
-            }});
-
-            item.addEventListener('mouseleave', function() {{
-                this.style.transform = 'translateY(0) scale(1)';
-            }});
-        }});
+        bindItems(document.querySelectorAll('.item'));
     </script>
 </body>
 </html>'''
-
-    return html_content
\ No newline at end of file
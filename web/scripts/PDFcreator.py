@@ -1,127 +1,424 @@
 import os
 import io
+import shutil
 import tempfile
+import uuid
+import functools
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Callable, List, Tuple, Optional
 from PIL import Image
 import warnings
 from math import ceil
+from collections import Counter, OrderedDict
+from web.scripts.log_app import log_server_action
+from web.scripts.page_cache import PageCache, file_content_hash
+from web.scripts.jobs import JobCancelledError
+from web.scripts.raster_writer import ENCODING_AUTO, EncodedSheet, decode_sheet, encode_sheet, read_sheet_data
+from web.scripts.preview_store import PREVIEW_STORE, PreviewStore, preview_url
+from web.scripts.page_signatures import page_aliases
+from web.scripts.booklet_order import iter_sheet_sides, sheet_side, signature_ranges, total_sheet_count
 
 warnings.filterwarnings("ignore")
 
+# Размер листа A4 (альбомная ориентация) при 300 DPI
+A4_LANDSCAPE_SIZE = (3508, 2480)
+# Размер превью листа для галереи
+PREVIEW_SIZE = (1200, 850)
+# Размер листа в режиме быстрого превью: A4 (альбомная), вписанный в PREVIEW_SIZE
+PREVIEW_SHEET_SIZE = (PREVIEW_SIZE[0], round(PREVIEW_SIZE[0] * A4_LANDSCAPE_SIZE[1] / A4_LANDSCAPE_SIZE[0]))
+# Режимы раскладки: векторный (исходные страницы PDF) и растровый (запасной)
+BACKEND_VECTOR = "vector"
+BACKEND_RASTER = "raster"
+# Потоковый растровый режим с ограниченным окном страниц в памяти
+BACKEND_STREAM = "stream"
+# Потолок памяти окна отрендеренных страниц по умолчанию (МБ)
+DEFAULT_MEMORY_LIMIT_MB = 256
+# Минимальное количество страниц, начиная с которого рендеринг распараллеливается
+PARALLEL_MIN_PAGES = 16
+# Количество диапазонов страниц на один процесс рендеринга
+PARALLEL_CHUNKS_PER_WORKER = 4
+
+
+def _pixmap_to_image(pix) -> Image.Image:
+    """Строит изображение прямо из буфера пикселей pixmap, без промежуточного кодирования в PPM"""
+    samples = getattr(pix, "samples_mv", None)
+    if samples is None:
+        samples = pix.samples
+    return Image.frombuffer("RGB", (pix.width, pix.height), samples, "raw", "RGB", pix.stride, 1)
+
+
+def fit_size(width: float, height: float, target_width: int, target_height: int) -> Tuple[int, int]:
+    """Размер страницы, вписанной в место на листе с сохранением пропорций.
+    Общий для create_combined_page и рендеринга страниц под размер места (_page_matrix)"""
+    if (width == target_width and height <= target_height) or (height == target_height and width <= target_width):
+        # Страница уже отрендерена под свое место
+        return int(width), int(height)
+    img_ratio = width / height
+    if img_ratio > target_width / target_height:
+        return target_width, int(target_width / img_ratio)
+    return int(target_height * img_ratio), target_height
+
+
+def _page_matrix(page, dpi: float, sheet_size: Optional[Tuple[int, int]] = None):
+    """Матрица рендеринга страницы. С sheet_size страница рендерится сразу в размер своего места
+    на листе: поворот и вписывание как в create_combined_page, без последующего масштабирования.
+    Квадратные страницы не поворачиваются - их поворачивает компоновщик без изменения размера."""
+    import fitz  # PyMuPDF
+    if sheet_size is None:
+        return fitz.Matrix(dpi / 72, dpi / 72)
+    width, height = page.rect.width, page.rect.height
+    if width > height:
+        # Альбомная страница: масштаб в координатах страницы, затем поворот как Image.rotate(90)
+        new_width, new_height = fit_size(height, width, sheet_size[0] // 2, sheet_size[1])
+        return fitz.Matrix(new_height / width, new_width / height) * fitz.Matrix(-90)
+    new_width, new_height = fit_size(width, height, sheet_size[0] // 2, sheet_size[1])
+    return fitz.Matrix(new_width / width, new_height / height)
+
+
+def _render_page_chunk(pdf_path: str, page_indices: List[int], dpi: int,
+                       sheet_size: Optional[Tuple[int, int]] = None) -> List[Tuple[int, int, int, bytes]]:
+    """Рендерит часть страниц в отдельном процессе со своим документом fitz.
+    Возвращает буферы пикселей RGB: (индекс страницы, ширина, высота, байты)."""
+    import fitz  # PyMuPDF
+    rendered = []
+    with fitz.open(pdf_path) as pdf_document:
+        for page_num in page_indices:
+            page = pdf_document.load_page(page_num)
+            pix = page.get_pixmap(matrix=_page_matrix(page, dpi, sheet_size), alpha=False)
+            rendered.append((page_num, pix.width, pix.height, pix.samples))
+    return rendered
+
+
+def _encode_preview(combined_img: Image.Image) -> bytes:
+    """Масштабирует лист до размера превью (уменьшает) и кодирует в JPEG"""
+    preview_img = combined_img.copy()
+    preview_img.thumbnail(PREVIEW_SIZE, Image.LANCZOS)
+    buffer = io.BytesIO()
+    preview_img.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _preview_from_encoded(sheet: EncodedSheet) -> bytes:
+    """Превью из закодированного листа растрового режима"""
+    img = decode_sheet(sheet, draft_size=PREVIEW_SIZE)
+    if img.mode == "1":
+        # Уменьшение черно-белого листа в режиме "1" потеряло бы сглаживание
+        img = img.convert("L")
+    return _encode_preview(img)
+
+
+def _preview_from_written_sheet(pdf_path: str, sheet: EncodedSheet, data_span: Tuple[int, int]) -> bytes:
+    """Превью листа растрового буклета: данные листа читаются из готового файла,
+    поэтому превью не удерживают закодированные листы в памяти"""
+    return _preview_from_encoded(read_sheet_data(pdf_path, sheet, data_span))
+
+
+def _render_sheet_preview(sheet) -> bytes:
+    """Превью листа готового буклета, отрендеренное сразу в размере галереи"""
+    import fitz  # PyMuPDF
+    zoom = min(PREVIEW_SIZE[0] / sheet.rect.width, PREVIEW_SIZE[1] / sheet.rect.height)
+    pix = sheet.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    return pix.tobytes("jpg", jpg_quality=90)
+
+
+def _preview_from_pdf_page(pdf_path: str, index: int) -> bytes:
+    """Превью листа index из файла буклета"""
+    import fitz  # PyMuPDF
+    with fitz.open(pdf_path) as booklet:
+        return _render_sheet_preview(booklet[index])
+
+
+def _compose_signature_chunk(pdf_path: str, sides: List[Tuple[int, Optional[int], Optional[int]]],
+                             options: dict) -> Tuple[dict, int]:
+    """Компонует и кодирует листы одной тетради в отдельном процессе со своим окном страниц.
+    sides - (номер стороны, левая и правая страницы после page_aliases).
+    Возвращает ключ листа -> EncodedSheet и количество отрендеренных страниц."""
+    creator = PDFBookletCreator(pdf_path, render_workers=1, memory_limit_mb=options["memory_limit_mb"],
+                                use_page_cache=False, raster_encoding=options["encoding"],
+                                jpeg_quality=options["jpeg_quality"], skip_duplicate_pages=False,
+                                preview_store=None)
+    window = _PageWindow(pdf_path, 72, creator.memory_limit_mb * 1024 * 1024, sheet_size=A4_LANDSCAPE_SIZE)
+    composed = {}
+    try:
+        for index, left_num, right_num in sides:
+            key = creator._sheet_key(index, left_num, right_num, options["flip_horizontal"], options["flip_vertical"])
+            if key not in composed:
+                composed[key] = creator._compose_side(window.get(left_num - 1) if left_num else None,
+                                                      window.get(right_num - 1) if right_num else None,
+                                                      index, options["flip_horizontal"], options["flip_vertical"])
+        return composed, window.rendered_pages
+    finally:
+        window.close()
+        creator.cleanup()
+
+
+class _PageWindow:
+    """LRU-окно отрендеренных страниц с ограничением по объему памяти.
+    Страница рендерится только когда она нужна текущему листу."""
+
+    def __init__(self, pdf_path: str, dpi: float, max_bytes: int,
+                 on_render: Optional[Callable[[], None]] = None,
+                 sheet_size: Optional[Tuple[int, int]] = None):
+        import fitz  # PyMuPDF
+        self._document = fitz.open(pdf_path)
+        self._dpi = dpi
+        # Размер листа: страницы рендерятся сразу под свое место на нем (dpi не используется)
+        self._sheet_size = sheet_size
+        self.max_bytes = max_bytes
+        self._pages: "OrderedDict[int, Image.Image]" = OrderedDict()
+        self.current_bytes = 0
+        self.peak_bytes = 0
+        self.rendered_pages = 0
+        self._on_render = on_render
+        # Байты, отрендеренные с последней очистки хранилища MuPDF (см. get)
+        self._rendered_since_shrink = 0
+
+    def __len__(self) -> int:
+        return len(self._document)
+
+    @staticmethod
+    def _image_bytes(img: Image.Image) -> int:
+        return img.width * img.height * len(img.getbands())
+
+    def get(self, page_num: int) -> Image.Image:
+        if page_num in self._pages:
+            self._pages.move_to_end(page_num)
+            return self._pages[page_num]
+
+        page = self._document.load_page(page_num)
+        pix = page.get_pixmap(matrix=_page_matrix(page, self._dpi, self._sheet_size), alpha=False)
+        img = _pixmap_to_image(pix)
+        del pix
+        self.rendered_pages += 1
+        if self._on_render is not None:
+            self._on_render()
+        size = self._image_bytes(img)
+
+        # Вытесняем давно не использованные страницы, чтобы уложиться в потолок памяти
+        while self._pages and self.current_bytes + size > self.max_bytes:
+            _, evicted = self._pages.popitem(last=False)
+            self.current_bytes -= self._image_bytes(evicted)
+
+        self._pages[page_num] = img
+        self.current_bytes += size
+        self.peak_bytes = max(self.peak_bytes, self.current_bytes)
+
+        # MuPDF кэширует декодированные изображения и шрифты документа в своем хранилище
+        # без заметного ограничения; очищаем его после каждого объема окна отрендеренных страниц,
+        # чтобы память процесса не росла с длиной документа
+        self._rendered_since_shrink += size
+        if self._rendered_since_shrink >= self.max_bytes:
+            import fitz  # PyMuPDF
+            fitz.TOOLS.store_shrink(100)
+            self._rendered_since_shrink = 0
+        return img
+
+    def close(self) -> None:
+        self._pages.clear()
+        self.current_bytes = 0
+        self._document.close()
+
+
+class BookletJobState:
+    """Состояние последнего задания для инкрементальной перекомпоновки.
+    Листы идентифицируются парой страниц, стороной и отражениями обратной стороны."""
+
+    def __init__(self, source_key: tuple):
+        self.source_key = source_key
+        # Ключ листа -> закодированный лист для растровых режимов (EncodedSheet)
+        self.sheets: dict = {}
+
+
 class PDFBookletCreator:
-    def __init__(self, input_pdf_path: str, output_pdf_path: str = None):
+    def __init__(self, input_pdf_path: str, output_pdf_path: str = None, render_workers: Optional[int] = None,
+                 memory_limit_mb: int = DEFAULT_MEMORY_LIMIT_MB, use_page_cache: bool = True,
+                 progress_callback: Optional[Callable[[str, int], None]] = None,
+                 cancel_check: Optional[Callable[[], None]] = None,
+                 raster_encoding: str = ENCODING_AUTO, jpeg_quality: int = 75, skip_duplicate_pages: bool = True,
+                 job_id: Optional[str] = None, preview_store: Optional[PreviewStore] = PREVIEW_STORE):
         self.input_pdf_path = Path(input_pdf_path)
         if output_pdf_path is None:
             output_name = self.input_pdf_path.stem + "_booklet.pdf"
             self.output_pdf_path = self.input_pdf_path.parent / output_name
         else:
             self.output_pdf_path = Path(output_pdf_path)
-        self.temp_dir = tempfile.mkdtemp(prefix="pdf_booklet_")
+        # Количество процессов рендеринга (None - выбирается автоматически)
+        self.render_workers = render_workers
+        # Потолок памяти окна страниц для потокового режима
+        self.memory_limit_mb = memory_limit_mb
+        # Дисковый кэш отрендеренных страниц (ключ - хэш содержимого, номер страницы и DPI)
+        self.page_cache = PageCache() if use_page_cache else None
+        # Состояние последнего выполненного задания (см. BookletJobState)
+        self.job_state: Optional[BookletJobState] = None
+        # Обработчик прогресса: progress_callback(событие, значение), см. _report_progress
+        self.progress_callback = progress_callback
+        # Контрольная точка отмены: вызывается между страницами и листами,
+        # прерывает задание исключением JobCancelledError
+        self.cancel_check = cancel_check
+        # Сжатие листов в растровых режимах (см. RasterPdfWriter)
+        self.raster_encoding = raster_encoding
+        self.jpeg_quality = jpeg_quality
+        # Пустые страницы не рендерятся, одинаковые рендерятся и компонуются один раз (см. page_aliases)
+        self.skip_duplicate_pages = skip_duplicate_pages
+        # Идентификатор задания: превью параллельных заданий хранятся в preview_store под своими job_id
+        self.job_id = job_id or uuid.uuid4().hex
+        # Хранилище превью в памяти (None - превью не создаются, пакетная обработка)
+        self.preview_store = preview_store
+        self._temp_dir: Optional[str] = None
+
+    @property
+    def temp_dir(self) -> str:
+        # Временная папка создается только при первом обращении
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.mkdtemp(prefix="pdf_booklet_")
+        return self._temp_dir
+
+    def _report_progress(self, event: str, value: int = 1) -> None:
+        # События: pages_rendered, sheets_composed, bytes_written (приращения),
+        # total_pages, total_sheets (общее количество)
+        if self.progress_callback is not None:
+            self.progress_callback(event, value)
+
+    def _checkpoint(self) -> None:
+        if self.cancel_check is not None:
+            self.cancel_check()
+
+    def _partial_output_path(self) -> Path:
+        # Недописанный буклет: во временном файле рядом с итоговым, чтобы os.replace
+        # заменил итоговый файл целиком и только после успешного завершения
+        return self.output_pdf_path.with_name(f".{self.output_pdf_path.name}.{self.job_id}.tmp")
+
+    @staticmethod
+    def _remove_partial_output(partial_path: Path) -> None:
+        try:
+            if partial_path.exists():
+                partial_path.unlink()
+        except OSError:
+            pass
+
+    def _abort_job(self, partial_path: Path) -> None:
+        # Отмененное задание сразу освобождает временные файлы и свой недописанный результат;
+        # файл, который уже лежал по пути результата, не трогается
+        self.job_state = None
+        self._remove_partial_output(partial_path)
+        self.cleanup()
 
-    def pdf_to_images(self, pdf_path: str, dpi: int = 200) -> List[Image.Image]:
+    def _resolve_render_workers(self, total_pages: int, workers: Optional[int]) -> int:
+        # Небольшие документы рендерятся последовательно: запуск процессов дороже самого рендеринга
+        if workers is None:
+            if total_pages < PARALLEL_MIN_PAGES:
+                return 1
+            workers = os.cpu_count() or 1
+        return max(1, min(workers, total_pages))
+
+    def pdf_to_images(self, pdf_path: str, dpi: int = 200, workers: Optional[int] = None,
+                      sheet_size: Optional[Tuple[int, int]] = None,
+                      page_indices: Optional[List[int]] = None) -> List[Optional[Image.Image]]:
+        # С sheet_size каждая страница рендерится сразу в размер своего места на листе (см. _page_matrix).
+        # С page_indices рендерятся только эти страницы, на местах остальных остается None
         try:
             import fitz  # PyMuPDF
-            images = []
-            pdf_document = fitz.open(pdf_path)
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                zoom = dpi / 72
-                mat = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("ppm")
-                img = Image.open(io.BytesIO(img_data))
-                images.append(img)
-            pdf_document.close()
+            with fitz.open(pdf_path) as pdf_document:
+                total_pages = len(pdf_document)
+            images: List[Optional[Image.Image]] = [None] * total_pages
+            if page_indices is None:
+                page_indices = range(total_pages)
+
+            # Страницы, уже отрендеренные ранее с тем же DPI или под тот же лист, берем из дискового кэша
+            variant = dpi if sheet_size is None else f"fit{sheet_size[0]}x{sheet_size[1]}"
+            content_hash = None
+            if self.page_cache is not None:
+                content_hash = file_content_hash(pdf_path)
+                for page_num in page_indices:
+                    self._checkpoint()
+                    images[page_num] = self.page_cache.get(content_hash, page_num, variant)
+            missing = [page_num for page_num in page_indices if images[page_num] is None]
+            self._report_progress("total_pages", len(page_indices))
+            self._report_progress("pages_rendered", len(page_indices) - len(missing))
+
+            workers = self._resolve_render_workers(len(missing), workers)
+            if workers > 1:
+                rendered = self._render_pages_parallel(pdf_path, missing, dpi, workers, sheet_size)
+            else:
+                rendered = self._render_pages_serial(pdf_path, missing, dpi, sheet_size)
+
+            for page_num, img in rendered.items():
+                images[page_num] = img
+                if self.page_cache is not None:
+                    self.page_cache.put(content_hash, page_num, variant, img)
+
+            if self.page_cache is not None:
+                freed = self.page_cache.trim() if rendered else 0
+                log_server_action('Кэш отрендеренных страниц', 'info', {
+                    'file': str(pdf_path),
+                    'variant': variant,
+                    'hits': len(page_indices) - len(missing),
+                    'misses': len(missing),
+                    'evicted_bytes': freed
+                })
             return images
+        except JobCancelledError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Ошибка при конвертации PDF в изображения: {e}")
 
+    def _render_pages_serial(self, pdf_path: str, page_indices: List[int], dpi: int,
+                             sheet_size: Optional[Tuple[int, int]] = None) -> dict:
+        import fitz  # PyMuPDF
+        rendered = {}
+        if not page_indices:
+            return rendered
+        pdf_document = fitz.open(pdf_path)
+        try:
+            for page_num in page_indices:
+                self._checkpoint()
+                page = pdf_document.load_page(page_num)
+                pix = page.get_pixmap(matrix=_page_matrix(page, dpi, sheet_size), alpha=False)
+                rendered[page_num] = _pixmap_to_image(pix)
+                self._report_progress("pages_rendered")
+        finally:
+            pdf_document.close()
+        return rendered
+
+    def _render_pages_parallel(self, pdf_path: str, page_indices: List[int], dpi: int, workers: int,
+                               sheet_size: Optional[Tuple[int, int]] = None) -> dict:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Непрерывные диапазоны страниц: каждый процесс открывает документ один раз на диапазон.
+        # Диапазонов в несколько раз больше, чем процессов, чтобы отмена срабатывала без долгого ожидания
+        chunk_size = ceil(len(page_indices) / (workers * PARALLEL_CHUNKS_PER_WORKER))
+        chunks = [page_indices[start:start + chunk_size] for start in range(0, len(page_indices), chunk_size)]
+
+        rendered = {}
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            for chunk in executor.map(_render_page_chunk, [pdf_path] * len(chunks), chunks, [dpi] * len(chunks),
+                                      [sheet_size] * len(chunks)):
+                for page_num, width, height, samples in chunk:
+                    rendered[page_num] = Image.frombuffer("RGB", (width, height), samples, "raw", "RGB", 0, 1)
+                self._report_progress("pages_rendered", len(chunk))
+                self._checkpoint()
+        except JobCancelledError:
+            # Не дожидаемся оставшихся диапазонов
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        return rendered
+
     def calculate_booklet_order(self, total_pages: int, rotate_all: bool, rotate: bool = False,
-                                flip_horizontal: bool = False, flip_vertical: bool = False):
-        # Создает последовательность страниц для буклета
-        if total_pages <= 0:
-            return []
-
-        num_rows = ceil(total_pages / 4)
-
-        # Создаем матрицу 4xnum_rows (4 колонки, num_rows строк)
-        matrix = [[None, None, None, None] for _ in range(num_rows)]
-
-        # Заполняем матрицу
-        current_page = 1
-
-        # 1. Заполняем четные позиции (0 и 2) по возрастанию
-        for i in range(num_rows):
-            for j in range(4):
-                if current_page > total_pages:
-                    break
-                if j % 2 == 0:
-                    matrix[i][j] = current_page
-                    current_page += 1
-            if current_page > total_pages:
-                break
-
-
-        for i in range(num_rows - 1, -1, -1):
-            for j in range(3, -1, -1):
-                if current_page > total_pages:
-                    break
-                if j % 2 != 0:
-                    matrix[i][j] = current_page
-                    current_page += 1
-            if current_page > total_pages:
-                break
-
-
-        flat_list = []
-
-        for row in range(num_rows):
-            for col in range(4):
-                flat_list.append(matrix[row][col])
-
-        lst = [flat_list[i:i + 2] for i in range(0, len(flat_list), 2)]
-
-
-
-        # Функция swap исправлена - работает с индексами
-        if rotate_all:
-            for i in range(len(lst)):
-                temp = lst[i][0]
-                lst[i][0] = lst[i][1]
-                lst[i][1] = temp
-
-        if rotate:
-            for i in range(1, len(lst), 2):
-                temp = lst[i][0]
-                lst[i][0] = lst[i][1]
-                lst[i][1] = temp
-
-        flat_list = []
-        for row in range(len(lst)):
-            for col in range(2):
-                flat_list.append(lst[row][col])
-        result_pairs = []
-        for i in range(0, len(flat_list) - 1, 2):
-            if i + 1 < len(flat_list):
-                if flat_list[i] is not None and flat_list[i + 1] is not None:
-                    result_pairs.append((flat_list[i], flat_list[i + 1]))
-                elif flat_list[i] is not None:
-                    result_pairs.append((flat_list[i], None))
-                elif flat_list[i + 1] is not None:
-                    result_pairs.append((None, flat_list[i + 1]))
-            elif flat_list[i] is not None:
-                result_pairs.append((flat_list[i], None))
-        return result_pairs
+                                flip_horizontal: bool = False, flip_vertical: bool = False,
+                                signature_sheets: Optional[int] = None):
+        # Создает последовательность страниц для буклета (каждая сторона вычисляется напрямую, см. sheet_side).
+        # Отражения на порядок страниц не влияют. С signature_sheets документ делится на тетради
+        return list(iter_sheet_sides(total_pages, rotate_all, rotate, signature_sheets))
+
     def create_combined_page(self, left_page: Optional[Image.Image], right_page: Optional[Image.Image], page_size: Tuple[int, int] = (3508, 2480), is_back_side: bool = False, flip_horizontal: bool = False, flip_vertical: bool = False) -> Image.Image:
         output_img = Image.new("RGB", page_size, "white")
         page_width = page_size[0] // 2
         page_height = page_size[1]
 
-        def prepare_image(img: Optional[Image.Image], target_width: int, target_height: int,
-                          flip_for_back: bool = False) -> Image.Image:
-            if img is None:
-                return Image.new("RGB", (target_width, target_height), "white")
+        def place_image(img: Image.Image, x_slot: int, target_width: int, target_height: int,
+                        flip_for_back: bool = False) -> None:
             if img.height > img.width:
                 pass
             else:
@@ -133,87 +430,421 @@ class PDFBookletCreator:
                 if flip_horizontal:
                     img = img.transpose(Image.FLIP_LEFT_RIGHT)
 
-            img_ratio = img.width / img.height
-            target_ratio = target_width / target_height
-            if img_ratio > target_ratio:
-                new_width = target_width
-                new_height = int(target_width / img_ratio)
-            else:
-                new_height = target_height
-                new_width = int(target_height * img_ratio)
-            img_resized = img.resize((new_width, new_height), Image.LANCZOS)
-            result = Image.new("RGB", (target_width, target_height), "white")
-            x_offset = (target_width - new_width) // 2
+            new_width, new_height = fit_size(img.width, img.height, target_width, target_height)
+            if img.size != (new_width, new_height):
+                img = img.resize((new_width, new_height), Image.LANCZOS)
+            # Страница вставляется прямо в лист: поля вокруг нее уже белые
+            x_offset = x_slot + (target_width - new_width) // 2
             y_offset = (target_height - new_height) // 2
-            result.paste(img_resized, (x_offset, y_offset))
-            return result
+            output_img.paste(img, (x_offset, y_offset))
 
+        # Пустая половина листа (None) остается белой без какой-либо обработки
         if left_page is not None:
-            left_img = prepare_image(left_page, page_width, page_height, is_back_side)
-            output_img.paste(left_img, (0, 0))
+            place_image(left_page, 0, page_width, page_height, is_back_side)
         if right_page is not None:
-            right_img = prepare_image(right_page, page_width, page_height, is_back_side)
-            output_img.paste(right_img, (page_width, 0))
+            place_image(right_page, page_width, page_width, page_height, is_back_side)
         return output_img
 
-    def create_booklet_pdf(self, rotate_all: bool, rotate: bool = False, flip_horizontal: bool = False, flip_vertical: bool = False) -> str:
-        all_images = self.pdf_to_images(str(self.input_pdf_path))
-        total_pages = len(all_images)
-        booklet_pairs = self.calculate_booklet_order(total_pages, rotate_all, rotate, flip_horizontal, flip_vertical)
-        output_images = []
-        a4_size_landscape = (3508, 2480)
-        gallery_pages = []
-
-        # Создаем папку для временных изображений
-        temp_images_dir = os.path.join("web", "assets", "temp_pictures")
-        if not os.path.exists(temp_images_dir):
-            os.makedirs(temp_images_dir)
-
-        # Очищаем предыдущие временные файлы
-        for file in os.listdir(temp_images_dir):
-            if file.endswith(".jpg"):
-                os.remove(os.path.join(temp_images_dir, file))
-
+    def _compose_side(self, left_page, right_page, index: int, flip_horizontal: bool,
+                      flip_vertical: bool) -> EncodedSheet:
+        # Компонует и кодирует сторону листа итогового PDF
+        combined_img = self.create_combined_page(left_page, right_page, A4_LANDSCAPE_SIZE, (index % 2 == 1),
+                                                 flip_horizontal, flip_vertical)
+        return encode_sheet(combined_img, self.raster_encoding, self.jpeg_quality)
+
+    def _resolve_signature_workers(self, total_pages: int, signatures: int) -> int:
+        # Тетради независимы: каждую компонует свой процесс, но не больше процессов, чем тетрадей
+        return min(self._resolve_render_workers(total_pages, self.render_workers), signatures)
+
+    def _compose_signatures_parallel(self, signatures: List[list], workers: int, flip_horizontal: bool,
+                                     flip_vertical: bool):
+        # Результаты тетрадей выдаются строго по порядку, по мере готовности
+        from concurrent.futures import ProcessPoolExecutor
+
+        options = {
+            "memory_limit_mb": max(1, self.memory_limit_mb // workers),
+            "encoding": self.raster_encoding,
+            "jpeg_quality": self.jpeg_quality,
+            "flip_horizontal": flip_horizontal,
+            "flip_vertical": flip_vertical
+        }
+        executor = ProcessPoolExecutor(max_workers=workers)
+        finished = False
+        try:
+            for composed, rendered in executor.map(_compose_signature_chunk, [str(self.input_pdf_path)] * len(signatures),
+                                                   signatures, [options] * len(signatures)):
+                self._report_progress("pages_rendered", rendered)
+                yield composed
+            finished = True
+        finally:
+            # При отмене не дожидаемся оставшихся тетрадей
+            executor.shutdown(wait=finished, cancel_futures=not finished)
+
+    def _gallery_entry(self, index: int, left_num: Optional[int], right_num: Optional[int], image_path: str) -> dict:
+        return {
+            "page_number": index + 1,
+            "image_path": image_path,
+            "is_back_side": (index % 2 == 1),
+            "left_page_num": left_num,
+            "right_page_num": right_num
+        }
+
+    def _sheet_key(self, index: int, left_num: Optional[int], right_num: Optional[int],
+                   flip_horizontal: bool, flip_vertical: bool) -> tuple:
+        # Отражения влияют только на обратную сторону, поэтому для лицевой в ключ не входят
+        is_back_side = (index % 2 == 1)
+        return (left_num, right_num, is_back_side, is_back_side and flip_horizontal, is_back_side and flip_vertical)
+
+    def _page_aliases(self, total_pages: int) -> List[Optional[int]]:
+        # Номер страницы (с 1), которую нужно рендерить вместо данной, или None для пустой страницы
+        if not self.skip_duplicate_pages:
+            return list(range(1, total_pages + 1))
+        return [None if alias is None else alias + 1 for alias in page_aliases(str(self.input_pdf_path))]
+
+    def _alias_key(self, index: int, left_num: Optional[int], right_num: Optional[int],
+                   aliases: List[Optional[int]], flip_horizontal: bool, flip_vertical: bool) -> tuple:
+        # Ключ листа по содержимому: листы из одинаковых страниц компонуются один раз
+        return self._sheet_key(index, aliases[left_num - 1] if left_num else None,
+                               aliases[right_num - 1] if right_num else None, flip_horizontal, flip_vertical)
+
+    @staticmethod
+    def _alias_stats(aliases: List[Optional[int]]) -> dict:
+        return {
+            "unique_pages": sum(1 for page_num, alias in enumerate(aliases, 1) if alias == page_num),
+            "blank_pages": aliases.count(None)
+        }
+
+    def _source_key(self, backend: str) -> tuple:
+        stat = os.stat(self.input_pdf_path)
+        return (backend, str(self.input_pdf_path.resolve()), stat.st_size, stat.st_mtime_ns,
+                self.raster_encoding, self.jpeg_quality, self.skip_duplicate_pages)
+
+    def _reusable_state(self, previous_state: Optional[BookletJobState], source_key: tuple) -> Optional[BookletJobState]:
+        # Состояние прошлого задания годится только для того же файла, режима и сжатия листов
+        if previous_state is None or previous_state.source_key != source_key:
+            return None
+        return previous_state
+
+    def _register_preview(self, index: int, producer: Callable[[], bytes]) -> Optional[str]:
+        # Превью кодируется функцией producer, когда галерея запросит его впервые
+        if self.preview_store is None:
+            return None
+        return self.preview_store.put(self.job_id, index, producer)
+
+    def create_booklet(self, rotate_all: bool, rotate: bool = False, flip_horizontal: bool = False,
+                       flip_vertical: bool = False, backend: str = BACKEND_VECTOR,
+                       previous_state: Optional[BookletJobState] = None,
+                       signature_sheets: Optional[int] = None) -> dict:
+        """Создает буклет за один проход: каждая страница обрабатывается один раз,
+        каждый лист компонуется один раз, из него же получаются превью и итоговый PDF.
+        Превью не пишутся на диск: они регистрируются в self.preview_store и кодируются
+        только при запросе галереей (без preview_store превью не создаются - пакетная обработка).
+        Если передано состояние прошлого задания для того же файла, в растровых режимах
+        неизменившиеся листы берутся из него. Векторный режим раскладывает все листы заново:
+        размещение страниц без растеризации дешевле сравнения листов, а превью кодируются по запросу.
+        Новое состояние сохраняется в self.job_state.
+        С signature_sheets документ раскладывается тетрадями по signature_sheets листов;
+        в потоковом режиме тетради компонуются параллельно и записываются по порядку."""
+        if signature_sheets is not None and signature_sheets < 0:
+            raise ValueError(f"Некорректное количество листов в тетради: {signature_sheets}")
+        if backend not in (BACKEND_VECTOR, BACKEND_RASTER, BACKEND_STREAM):
+            raise ValueError(f"Неизвестный режим раскладки: {backend}")
+
+        source_key = self._source_key(backend)
+        previous_state = self._reusable_state(previous_state, source_key)
+        state = BookletJobState(source_key)
+        partial_path = self._partial_output_path()
 
+        try:
+            if backend == BACKEND_VECTOR:
+                result = self._create_booklet_vector(rotate_all, rotate, flip_horizontal, flip_vertical,
+                                                     signature_sheets, str(partial_path))
+            else:
+                result = self._create_booklet_raster(rotate_all, rotate, flip_horizontal, flip_vertical,
+                                                     previous_state, state, streaming=(backend == BACKEND_STREAM),
+                                                     signature_sheets=signature_sheets,
+                                                     output_path=str(partial_path))
+            os.replace(partial_path, self.output_pdf_path)
+        except JobCancelledError:
+            self._abort_job(partial_path)
+            raise
+        except Exception:
+            self._remove_partial_output(partial_path)
+            raise
+        self.job_state = state
+        result["backend"] = backend
+        result["job_id"] = self.job_id
+        result["signatures"] = len(signature_ranges(result["source_pages"], signature_sheets))
+        return result
+
+    def _create_booklet_vector(self, rotate_all: bool, rotate: bool, flip_horizontal: bool, flip_vertical: bool,
+                               signature_sheets: Optional[int] = None, output_path: Optional[str] = None) -> dict:
+        # output_path - файл, в который пишется буклет (по умолчанию итоговый);
+        # превью по запросу галереи рендерятся из итогового файла
+        import fitz  # PyMuPDF
+        from web.scripts.imposition import impose_vector
+
+        output_path = output_path or str(self.output_pdf_path)
+        with fitz.open(str(self.input_pdf_path)) as pdf_document:
+            total_pages = len(pdf_document)
+        booklet_pairs = self.calculate_booklet_order(total_pages, rotate_all, rotate, flip_horizontal, flip_vertical,
+                                                     signature_sheets)
+        self._report_progress("total_pages", total_pages)
+        self._report_progress("total_sheets", len(booklet_pairs))
+        # Пустые страницы не размещаются, повторяющиеся ссылаются на один и тот же XObject
+        aliases = self._page_aliases(total_pages)
+        placed_pairs = [(aliases[left_num - 1] if left_num else None, aliases[right_num - 1] if right_num else None)
+                        for left_num, right_num in booklet_pairs]
+        impose_vector(str(self.input_pdf_path), output_path, placed_pairs,
+                      flip_horizontal, flip_vertical, progress_callback=self.progress_callback,
+                      cancel_check=self.cancel_check)
+        self._report_progress("bytes_written", os.path.getsize(output_path))
+
+        # Превью рендерятся из готовых листов в размере галереи, только если галерея их запросит
+        gallery_pages = []
+        # Ключ листа по содержимому -> функция кодирования превью: одинаковые листы рендерятся один раз
+        previews = {}
         for i, (left_num, right_num) in enumerate(booklet_pairs):
-            left_img = all_images[left_num - 1] if left_num else None
-            right_img = all_images[right_num - 1] if right_num else None
-            is_back_side = (i % 2 == 1)
-            combined_img = self.create_combined_page(left_img, right_img, a4_size_landscape, is_back_side,
+            alias_key = self._alias_key(i, left_num, right_num, aliases, flip_horizontal, flip_vertical)
+            producer = previews.setdefault(
+                alias_key, functools.partial(_preview_from_pdf_page, str(self.output_pdf_path), i))
+            image_path = self._register_preview(i, producer)
+            gallery_pages.append(self._gallery_entry(i, left_num, right_num, image_path))
+
+        return {
+            "result_path": str(self.output_pdf_path),
+            "gallery_pages": gallery_pages,
+            "total_pages": len(gallery_pages),
+            "source_pages": total_pages,
+            **self._alias_stats(aliases)
+        }
+
+    def _create_booklet_raster(self, rotate_all: bool, rotate: bool, flip_horizontal: bool, flip_vertical: bool,
+                               previous_state: Optional[BookletJobState], state: BookletJobState, streaming: bool = False,
+                               signature_sheets: Optional[int] = None, output_path: Optional[str] = None) -> dict:
+        import fitz  # PyMuPDF
+        from web.scripts.raster_writer import RasterPdfWriter
+
+        max_bytes = self.memory_limit_mb * 1024 * 1024
+        window = None
+        all_images = None
+        signature_results = None
+        with fitz.open(str(self.input_pdf_path)) as pdf_document:
+            total_pages = len(pdf_document)
+        signatures = signature_ranges(total_pages, signature_sheets)
+        signature_workers = self._resolve_signature_workers(total_pages, len(signatures)) \
+            if streaming and signature_sheets else 1
+        if streaming and signature_workers == 1:
+            # Потоковый режим: страницы рендерятся по требованию в ограниченное LRU-окно
+            window = _PageWindow(str(self.input_pdf_path), 72, max_bytes,
+                                 on_render=lambda: self._report_progress("pages_rendered"),
+                                 sheet_size=A4_LANDSCAPE_SIZE)
+        aliases = self._page_aliases(total_pages)
+        unique_pages = sorted(set(alias - 1 for alias in aliases if alias is not None))
+
+        def get_page(page_num: Optional[int]) -> Optional[Image.Image]:
+            # Весь документ растеризуется только если есть хотя бы один изменившийся лист
+            nonlocal all_images
+            page_num = aliases[page_num - 1] if page_num else None
+            if not page_num:
+                return None
+            if window is not None:
+                return window.get(page_num - 1)
+            if all_images is None:
+                # Страницы рендерятся сразу под свое место на листе, без масштабирования при компоновке
+                all_images = self.pdf_to_images(str(self.input_pdf_path), workers=self.render_workers,
+                                                sheet_size=A4_LANDSCAPE_SIZE, page_indices=unique_pages)
+            return all_images[page_num - 1]
+
+        def alias(page_num: Optional[int]) -> Optional[int]:
+            return aliases[page_num - 1] if page_num else None
+
+        try:
+            # Стороны листов вычисляются по одной, по мере компоновки
+            sheet_total = total_sheet_count(total_pages, signature_sheets)
+            self._report_progress("total_pages", len(unique_pages))
+            self._report_progress("total_sheets", sheet_total)
+            gallery_pages = []
+            reused_sheets = 0
+            duplicate_sheets = 0
+            sheet_kinds = Counter()
+            # Сколько раз еще встретится каждый лист по содержимому: в composed остаются
+            # только листы, которые повторятся, и только до последнего повтора
+            remaining = Counter(self._alias_key(i, left_num, right_num, aliases, flip_horizontal, flip_vertical)
+                                for i, (left_num, right_num) in enumerate(
+                                    iter_sheet_sides(total_pages, rotate_all, rotate, signature_sheets)))
+            # Ключ листа по содержимому -> закодированный лист для еще не записанных повторов
+            composed = {}
+            # В потоковом режиме закодированные листы сохраняются для следующего задания (state.sheets)
+            # не больше чем на max_bytes: остальные листы при повторном экспорте компонуются заново
+            state_bytes = 0
+
+            if signature_workers > 1:
+                # Каждая тетрадь компонуется в своем процессе; листы, которые есть в прошлом задании, не передаются
+                tasks = []
+                for sides in signatures:
+                    task = []
+                    for i in sides:
+                        left_num, right_num = sheet_side(i, total_pages, rotate_all, rotate, signature_sheets)
+                        key = self._sheet_key(i, left_num, right_num, flip_horizontal, flip_vertical)
+                        if previous_state is None or key not in previous_state.sheets:
+                            task.append((i, alias(left_num), alias(right_num)))
+                    tasks.append(task)
+                signature_results = self._compose_signatures_parallel(tasks, signature_workers, flip_horizontal,
+                                                                      flip_vertical)
+            signature_starts = {sides.start for sides in signatures}
+            # Ключ листа по содержимому -> закодированный лист из процесса текущей тетради
+            ready = {}
+
+            # Каждый лист компонуется из нужных ему страниц и сразу записывается в файл
+            with RasterPdfWriter(output_path or str(self.output_pdf_path), jpeg_quality=self.jpeg_quality,
+                                 encoding=self.raster_encoding) as writer:
+                for i, (left_num, right_num) in enumerate(iter_sheet_sides(total_pages, rotate_all, rotate,
+                                                                           signature_sheets)):
+                    self._checkpoint()
+                    if signature_results is not None and i in signature_starts:
+                        # Листы очередной тетради (ждем, пока ее закончит свой процесс)
+                        ready = next(signature_results)
+                    key = self._sheet_key(i, left_num, right_num, flip_horizontal, flip_vertical)
+                    encoded = previous_state.sheets.get(key) if previous_state is not None else None
+                    alias_key = self._alias_key(i, left_num, right_num, aliases, flip_horizontal, flip_vertical)
+                    if encoded is not None:
+                        reused_sheets += 1
+                    elif alias_key in composed:
+                        # Такой же лист (повторяющиеся или пустые страницы) уже закодирован
+                        encoded = composed[alias_key]
+                        duplicate_sheets += 1
+                    elif alias_key in ready:
+                        encoded = ready.pop(alias_key)
+                    else:
+                        encoded = self._compose_side(get_page(left_num), get_page(right_num), i,
                                                      flip_horizontal, flip_vertical)
-            output_images.append(combined_img)
-
-            # Масштабируем для превью (уменьшаем размер)
-            preview_size = (1200, 850)  # Размер для превью
-            preview_img = combined_img.copy()
-            preview_img.thumbnail(preview_size, Image.LANCZOS)
-
-            # Сохраняем изображение в папку temp_pictures
-            temp_img_path = os.path.join(temp_images_dir, f"{i + 1}.jpg")
-            preview_img.save(temp_img_path, "JPEG", quality=90)
-
-            gallery_pages.append({
-                "page_number": i + 1,
-                "image_path": f"assets/temp_pictures/{i + 1}.jpg",
-                "is_back_side": is_back_side,
-                "left_page_num": left_num,
-                "right_page_num": right_num
-            })
-
-        if output_images:
-            output_images[0].save(
-                self.output_pdf_path,
-                "PDF",
-                resolution=300.0,
-                save_all=True,
-                append_images=output_images[1:]
-            )
-        return str(self.output_pdf_path)
+                    remaining[alias_key] -= 1
+                    if remaining[alias_key] > 0:
+                        composed[alias_key] = encoded
+                    else:
+                        composed.pop(alias_key, None)
+                    self._report_progress("sheets_composed")
+                    # Повторяющийся лист записывается один раз, следующие страницы ссылаются на него
+                    self._report_progress("bytes_written", writer.add_encoded_sheet(encoded, alias_key))
+                    sheet_kinds[encoded.kind] += 1
+                    if not streaming or state_bytes + len(encoded.data) <= max_bytes:
+                        state.sheets[key] = encoded
+                        state_bytes += len(encoded.data)
+                    # Превью по запросу декодируется из данных листа в готовом буклете:
+                    # функция кодирования хранит только параметры листа и место его данных в файле
+                    producer = functools.partial(_preview_from_written_sheet, str(self.output_pdf_path),
+                                                 encoded._replace(data=b""), writer.sheet_data_spans[-1])
+                    image_path = self._register_preview(i, producer)
+                    gallery_pages.append(self._gallery_entry(i, left_num, right_num, image_path))
+
+            result = {
+                "result_path": str(self.output_pdf_path),
+                "gallery_pages": gallery_pages,
+                "total_pages": len(gallery_pages),
+                "source_pages": total_pages,
+                "reused_sheets": reused_sheets,
+                "duplicate_sheets": duplicate_sheets,
+                **self._alias_stats(aliases),
+                # Размер каждого листа в файле и вид листов (цветной, серый, черно-белый)
+                "sheet_bytes": writer.sheet_sizes,
+                "sheet_kinds": dict(sheet_kinds)
+            }
+            if signature_workers > 1:
+                result["signature_workers"] = signature_workers
+            if window is not None:
+                result.update({
+                    "memory_limit_bytes": max_bytes,
+                    "peak_window_bytes": window.peak_bytes,
+                    "state_sheet_bytes": state_bytes,
+                    "rendered_pages": window.rendered_pages
+                })
+            return result
+        finally:
+            if signature_results is not None:
+                signature_results.close()
+            if window is not None:
+                window.close()
+
+    def create_preview(self, rotate_all: bool, rotate: bool = False, flip_horizontal: bool = False,
+                       flip_vertical: bool = False, signature_sheets: Optional[int] = None) -> dict:
+        """Быстрое превью буклета без создания итогового PDF.
+        Страницы рендерятся сразу в размер своего места на маленьком листе превью,
+        без масштабирования при компоновке. Итоговый PDF создает create_booklet.
+        Сразу возвращается только раскладка листов: превью регистрируются в self.preview_store
+        и рендерятся, когда галерея их запросит. Страницы документа при этом не читаются,
+        поэтому время до первого превью не зависит от длины документа."""
+        import fitz  # PyMuPDF
+
+        with fitz.open(str(self.input_pdf_path)) as pdf_document:
+            total_pages = len(pdf_document)
+        sheet_total = total_sheet_count(total_pages, signature_sheets)
+        self._report_progress("total_sheets", sheet_total)
+        if not sheet_total:
+            return {"gallery_pages": [], "total_pages": 0, "source_pages": total_pages}
+        return self._create_lazy_preview(total_pages, sheet_total, rotate_all, rotate,
+                                         flip_horizontal, flip_vertical, signature_sheets)
+
+    def _preview_side(self, left_page, right_page, index: int, flip_horizontal: bool, flip_vertical: bool) -> bytes:
+        # Лист быстрого превью в JPEG
+        combined_img = self.create_combined_page(left_page, right_page, PREVIEW_SHEET_SIZE, (index % 2 == 1),
+                                                 flip_horizontal, flip_vertical)
+        buffer = io.BytesIO()
+        combined_img.save(buffer, "JPEG", quality=90)
+        return buffer.getvalue()
+
+    def _render_preview_side(self, left_num: Optional[int], right_num: Optional[int], index: int,
+                             flip_horizontal: bool, flip_vertical: bool) -> bytes:
+        # Рендерит страницы одного листа быстрого превью по запросу галереи
+        import fitz  # PyMuPDF
+        pages = []
+        with fitz.open(str(self.input_pdf_path)) as pdf_document:
+            for page_num in (left_num, right_num):
+                if not page_num:
+                    pages.append(None)
+                    continue
+                page = pdf_document.load_page(page_num - 1)
+                pix = page.get_pixmap(matrix=_page_matrix(page, 72, PREVIEW_SHEET_SIZE), alpha=False)
+                pages.append(_pixmap_to_image(pix))
+        return self._preview_side(pages[0], pages[1], index, flip_horizontal, flip_vertical)
+
+    def _render_preview_sheet(self, total_pages: int, rotate_all: bool, rotate: bool, flip_horizontal: bool,
+                              flip_vertical: bool, signature_sheets: Optional[int], index: int) -> bytes:
+        # Лист быстрого превью по номеру: пара страниц вычисляется напрямую (см. sheet_side)
+        left_num, right_num = sheet_side(index, total_pages, rotate_all, rotate, signature_sheets)
+        return self._render_preview_side(left_num, right_num, index, flip_horizontal, flip_vertical)
+
+    def _create_lazy_preview(self, total_pages: int, sheet_total: int, rotate_all: bool, rotate: bool,
+                             flip_horizontal: bool, flip_vertical: bool, signature_sheets: Optional[int]) -> dict:
+        # Быстрое превью в памяти: сразу возвращается только раскладка листов, страницы рендерятся,
+        # когда галерея запросит лист. Пустые и повторяющиеся страницы не ищутся: это потребовало бы
+        # прочитать весь документ, а рендерятся только несколько видимых листов
+        if self.preview_store is not None:
+            self.preview_store.put_job(self.job_id, sheet_total, functools.partial(
+                self._render_preview_sheet, total_pages, rotate_all, rotate, flip_horizontal, flip_vertical,
+                signature_sheets))
+        gallery_pages = []
+        for i, (left_num, right_num) in enumerate(iter_sheet_sides(total_pages, rotate_all, rotate,
+                                                                   signature_sheets)):
+            image_path = preview_url(self.job_id, i) if self.preview_store is not None else None
+            gallery_pages.append(self._gallery_entry(i, left_num, right_num, image_path))
+        self._report_progress("sheets_composed", sheet_total)
+        return {
+            "gallery_pages": gallery_pages,
+            "total_pages": sheet_total,
+            "source_pages": total_pages,
+            "job_id": self.job_id
+        }
+
+    def create_booklet_pdf(self, rotate_all: bool, rotate: bool = False, flip_horizontal: bool = False,
+                           flip_vertical: bool = False, backend: str = BACKEND_VECTOR) -> str:
+        result = self.create_booklet(rotate_all, rotate, flip_horizontal, flip_vertical, backend=backend)
+        return result["result_path"]
 
     def cleanup(self):
-        import shutil
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+        temp_dir = getattr(self, "_temp_dir", None)
+        if temp_dir is not None and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
 
     def __del__(self):
         self.cleanup()
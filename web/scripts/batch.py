@@ -0,0 +1,165 @@
+# Пакетная обработка без графического интерфейса.
+# Запуск из корня проекта: python -m web.scripts.batch "docs/*.pdf" --output-dir out --workers 4
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+
+from web.scripts.PDFcreator import PDFBookletCreator, BACKEND_VECTOR, BACKEND_RASTER, BACKEND_STREAM
+from web.scripts.raster_writer import ENCODING_AUTO, RASTER_ENCODINGS
+
+# Суффикс имени выходного файла по умолчанию (как в PDFBookletCreator)
+OUTPUT_SUFFIX = "_booklet"
+
+
+def is_source_pdf(path: str, suffix: str = OUTPUT_SUFFIX) -> bool:
+    """PDF файл, который еще не является готовым буклетом"""
+    name = os.path.basename(path)
+    return name.lower().endswith(".pdf") and not name[:-4].endswith(suffix)
+
+
+def collect_inputs(patterns: List[str], suffix: str = OUTPUT_SUFFIX) -> List[str]:
+    """Разворачивает файлы, папки и glob-шаблоны в отсортированный список PDF без повторов.
+    Уже готовые буклеты (с суффиксом в имени) пропускаются."""
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = glob.glob(os.path.join(pattern, "*"))
+        elif glob.has_magic(pattern):
+            candidates = glob.glob(pattern, recursive=True)
+        else:
+            candidates = [pattern]
+        for path in candidates:
+            if is_source_pdf(path, suffix) and os.path.isfile(path):
+                found.append(os.path.abspath(path))
+    return sorted(set(found))
+
+
+def output_path_for(input_path: str, output_dir: Optional[str], suffix: str = OUTPUT_SUFFIX) -> str:
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    directory = output_dir or os.path.dirname(input_path)
+    return os.path.join(directory, f"{stem}{suffix}.pdf")
+
+
+def is_up_to_date(input_path: str, output_path: str) -> bool:
+    """Выходной файл новее входного - обработка не нужна"""
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+    except OSError:
+        return False
+
+
+def process_document(input_path: str, output_path: str, flags: dict, backend: str,
+                     encoding: str = ENCODING_AUTO, jpeg_quality: int = 75) -> dict:
+    """Создает один буклет. Выполняется в отдельном процессе пула.
+    encoding и jpeg_quality действуют только в растровых режимах."""
+    started = time.perf_counter()
+    entry = {"input": input_path, "output": output_path}
+    creator = None
+    try:
+        # Параллелизм уже на уровне документов - внутри процесса рендерим последовательно
+        # Превью в пакетной обработке не нужны
+        creator = PDFBookletCreator(input_path, output_path, render_workers=1,
+                                    raster_encoding=encoding, jpeg_quality=jpeg_quality, preview_store=None)
+        result = creator.create_booklet(backend=backend, **flags)
+        entry.update({
+            "status": "done",
+            "source_pages": result["source_pages"],
+            "sheets": result["total_pages"],
+            "output_bytes": os.path.getsize(output_path)
+        })
+    except Exception as e:
+        entry.update({"status": "error", "error": str(e)})
+    finally:
+        if creator is not None:
+            creator.cleanup()
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    return entry
+
+
+def run_batch(inputs: List[str], output_dir: Optional[str], flags: dict, backend: str = BACKEND_VECTOR,
+              workers: Optional[int] = None, force: bool = False, suffix: str = OUTPUT_SUFFIX,
+              encoding: str = ENCODING_AUTO, jpeg_quality: int = 75) -> dict:
+    """Обрабатывает документы параллельно и возвращает сводку по каждому файлу"""
+    started = time.perf_counter()
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    entries = []
+    pending = []
+    for input_path in inputs:
+        output_path = output_path_for(input_path, output_dir, suffix)
+        if not force and is_up_to_date(input_path, output_path):
+            entries.append({"input": input_path, "output": output_path, "status": "skipped", "seconds": 0.0})
+        else:
+            pending.append((input_path, output_path))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            futures = [executor.submit(process_document, input_path, output_path, flags, backend,
+                                       encoding, jpeg_quality)
+                       for input_path, output_path in pending]
+            for future in as_completed(futures):
+                entry = future.result()
+                entries.append(entry)
+                print(f"[{entry['status']}] {entry['input']} ({entry['seconds']:.2f} с)")
+
+    entries.sort(key=lambda item: item["input"])
+    return {
+        "backend": backend,
+        "encoding": encoding,
+        "flags": flags,
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "done": sum(1 for item in entries if item["status"] == "done"),
+        "skipped": sum(1 for item in entries if item["status"] == "skipped"),
+        "errors": sum(1 for item in entries if item["status"] == "error"),
+        "files": entries
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетное создание буклетов из PDF без графического интерфейса")
+    parser.add_argument("inputs", nargs="+", help="PDF файлы, папки или glob-шаблоны")
+    parser.add_argument("-o", "--output-dir", help="Папка для буклетов (по умолчанию - рядом с исходным файлом)")
+    parser.add_argument("-w", "--workers", type=int, help="Количество параллельных процессов")
+    parser.add_argument("--backend", choices=[BACKEND_VECTOR, BACKEND_RASTER, BACKEND_STREAM],
+                        default=BACKEND_VECTOR, help="Режим раскладки")
+    parser.add_argument("--encoding", choices=RASTER_ENCODINGS, default=ENCODING_AUTO,
+                        help="Сжатие листов в растровых режимах")
+    parser.add_argument("--quality", type=int, default=75, help="Качество JPEG в растровых режимах")
+    parser.add_argument("--rotate-all", action="store_true", help="Поворот всего документа")
+    parser.add_argument("--rotate", action="store_true", help="Поворот половины документа")
+    parser.add_argument("--flip-horizontal", action="store_true", help="Отражение по горизонтали")
+    parser.add_argument("--flip-vertical", action="store_true", help="Отражение по вертикали")
+    parser.add_argument("--signature-sheets", type=int, help="Листов в тетради (по умолчанию - один буклет)")
+    parser.add_argument("--force", action="store_true", help="Обрабатывать даже если буклет новее исходного файла")
+    parser.add_argument("--summary", default="booklet_summary.json", help="Файл JSON со сводкой")
+    args = parser.parse_args(argv)
+
+    flags = {
+        "rotate_all": args.rotate_all,
+        "rotate": args.rotate,
+        "flip_horizontal": args.flip_horizontal,
+        "flip_vertical": args.flip_vertical,
+        "signature_sheets": args.signature_sheets
+    }
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("PDF файлы не найдены")
+        return 1
+
+    summary = run_batch(inputs, args.output_dir, flags, args.backend, args.workers, args.force,
+                        encoding=args.encoding, jpeg_quality=args.quality)
+    with open(args.summary, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    print(f"Готово: {summary['done']}, пропущено: {summary['skipped']}, ошибок: {summary['errors']}, "
+          f"время: {summary['total_seconds']:.2f} с. Сводка: {args.summary}")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
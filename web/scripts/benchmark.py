@@ -0,0 +1,115 @@
+# Запуск из корня проекта: python -m web.scripts.benchmark input.pdf
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+from web.scripts.PDFcreator import PDFBookletCreator, BACKEND_VECTOR, BACKEND_RASTER, _pixmap_to_image
+from web.scripts.preview_store import PreviewStore
+
+
+def benchmark_backends(input_path: str, repeat: int = 1) -> list:
+    """Сравнивает векторный и растровый режимы раскладки по времени и размеру файла"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pdf_booklet_bench_") as work_dir:
+        for backend in (BACKEND_VECTOR, BACKEND_RASTER):
+            output_path = os.path.join(work_dir, f"{backend}.pdf")
+            timings = []
+            for _ in range(repeat):
+                creator = PDFBookletCreator(input_path, output_path, preview_store=PreviewStore())
+                start = time.perf_counter()
+                result = creator.create_booklet(False, backend=backend)
+                timings.append(time.perf_counter() - start)
+                creator.cleanup()
+            results.append({
+                "backend": backend,
+                "sheets": result["total_pages"],
+                "best_seconds": min(timings),
+                "output_bytes": os.path.getsize(output_path)
+            })
+    return results
+
+
+def benchmark_pixmap_conversion(input_path: str, dpi: int = 200, max_pages: int = 20, repeat: int = 3) -> list:
+    """Сравнивает способы превращения pixmap PyMuPDF в изображение: мс на страницу"""
+    import fitz  # PyMuPDF
+
+    def via_ppm(pix):
+        img = Image.open(io.BytesIO(pix.tobytes("ppm")))
+        img.load()
+        return img
+
+    methods = [
+        ("ppm", via_ppm),
+        ("samples_copy", lambda pix: Image.frombytes("RGB", (pix.width, pix.height), pix.samples)),
+        ("buffer_image", _pixmap_to_image)
+    ]
+
+    matrix = fitz.Matrix(dpi / 72, dpi / 72)
+    with fitz.open(input_path) as pdf_document:
+        pixmaps = [pdf_document.load_page(page_num).get_pixmap(matrix=matrix, alpha=False)
+                   for page_num in range(min(max_pages, len(pdf_document)))]
+
+    results = []
+    for name, convert in methods:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for pix in pixmaps:
+                convert(pix)
+            timings.append(time.perf_counter() - start)
+        results.append({"method": name, "ms_per_page": min(timings) * 1000 / len(pixmaps)})
+    return results
+
+
+def benchmark_previews(input_path: str, visible_sheets: int = 6, repeat: int = 1) -> dict:
+    """Превью в памяти: время до готовой раскладки галереи и время первых visible_sheets превью
+    (первый экран галереи), которые кодируются по запросу"""
+    gallery_timings = []
+    first_screen_timings = []
+    for _ in range(repeat):
+        store = PreviewStore()
+        creator = PDFBookletCreator(input_path, use_page_cache=False, preview_store=store)
+        start = time.perf_counter()
+        result = creator.create_preview(False)
+        gallery_timings.append(time.perf_counter() - start)
+        for index in range(min(visible_sheets, result["total_pages"])):
+            store.get(creator.job_id, index)
+        first_screen_timings.append(time.perf_counter() - start)
+        creator.cleanup()
+    return {
+        "sheets": result["total_pages"],
+        "gallery_seconds": min(gallery_timings),
+        "first_screen_seconds": min(first_screen_timings)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк режимов раскладки буклета")
+    parser.add_argument("input", help="Входной PDF файл")
+    parser.add_argument("--repeat", type=int, default=1, help="Количество повторов каждого замера")
+    parser.add_argument("--pixmaps", action="store_true", help="Замерить только конвертацию pixmap в изображение")
+    parser.add_argument("--previews", action="store_true", help="Замерить только превью в памяти")
+    args = parser.parse_args()
+
+    if args.previews:
+        row = benchmark_previews(args.input, repeat=args.repeat)
+        print(f"{row['sheets']} листов, галерея {row['gallery_seconds']:.2f} с, "
+              f"первый экран {row['first_screen_seconds']:.2f} с")
+        return
+
+    if args.pixmaps:
+        for row in benchmark_pixmap_conversion(args.input, repeat=max(args.repeat, 3)):
+            print(f"{row['method']:>12}: {row['ms_per_page']:.2f} мс/стр")
+        return
+
+    for row in benchmark_backends(args.input, args.repeat):
+        print(f"{row['backend']:>8}: {row['sheets']} листов, {row['best_seconds']:.2f} с, "
+              f"{row['output_bytes'] / 1024:.1f} КБ")
+
+
+if __name__ == "__main__":
+    main()
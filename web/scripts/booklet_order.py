@@ -0,0 +1,86 @@
+from typing import Iterator, List, Optional, Tuple
+
+SheetSide = Tuple[Optional[int], Optional[int]]
+
+
+def sheet_count(total_pages: int) -> int:
+    """Количество сторон листов в буклете из total_pages страниц"""
+    if total_pages <= 0:
+        return 0
+    return min(total_pages, 2 * ((total_pages + 3) // 4))
+
+
+def _side(index: int, total_pages: int, sides: int, rows: int, rotate_all: bool, rotate: bool) -> SheetSide:
+    # Вторая страница стороны: m-я по счету из оставшихся, которые раскладываются с конца
+    # (для четной стороны - вторая в паре, для нечетной - первая)
+    m = 2 * (rows - 1 - index // 2) + (1 - index % 2)
+    first = index + 1
+    second = sides + 1 + m if m < total_pages - sides else None
+    if rotate_all != (rotate and index % 2 == 1):
+        return second, first
+    return first, second
+
+
+def _signature_of(index: int, total_pages: int, signature_sheets: Optional[int]) -> Tuple[int, int, int]:
+    # Тетрадь, в которую попадает сторона листа index: (номер первой стороны, смещение страниц, число страниц).
+    # Во всех тетрадях, кроме последней, ровно 2 * signature_sheets сторон
+    if not signature_sheets:
+        return 0, 0, total_pages
+    number = index // (2 * signature_sheets)
+    offset = number * 4 * signature_sheets
+    return number * 2 * signature_sheets, offset, min(4 * signature_sheets, total_pages - offset)
+
+
+def signature_ranges(total_pages: int, signature_sheets: Optional[int] = None) -> List[range]:
+    """Номера сторон листов каждой тетради по порядку.
+    Тетрадь - signature_sheets листов (4 страницы на лист), сложенных и сшитых вместе;
+    без signature_sheets весь документ - одна тетрадь."""
+    if total_pages <= 0:
+        return []
+    if not signature_sheets:
+        return [range(sheet_count(total_pages))]
+    ranges = []
+    first_side = 0
+    for offset in range(0, total_pages, 4 * signature_sheets):
+        sides = sheet_count(min(4 * signature_sheets, total_pages - offset))
+        ranges.append(range(first_side, first_side + sides))
+        first_side += sides
+    return ranges
+
+
+def total_sheet_count(total_pages: int, signature_sheets: Optional[int] = None) -> int:
+    """Количество сторон листов с учетом разбиения на тетради"""
+    if not signature_sheets or total_pages <= 0:
+        return sheet_count(total_pages)
+    full, rest = divmod(total_pages, 4 * signature_sheets)
+    return full * 2 * signature_sheets + sheet_count(rest)
+
+
+def sheet_side(index: int, total_pages: int, rotate_all: bool = False, rotate: bool = False,
+               signature_sheets: Optional[int] = None) -> SheetSide:
+    """Пара страниц (левая, правая) на стороне листа index, номера страниц с 1, None - пустое место.
+    Вычисляется напрямую, без построения всей раскладки.
+
+    Раскладка: по одной странице на сторону идут по возрастанию (1, 2, 3, ...),
+    оставшиеся страницы - парами с конца буклета. При rotate_all меняются местами
+    страницы всех сторон, при rotate - страницы каждой второй стороны.
+    С signature_sheets так раскладывается каждая тетрадь отдельно (см. signature_ranges)."""
+    if not 0 <= index < total_sheet_count(total_pages, signature_sheets):
+        raise IndexError(f"Нет стороны листа {index} в буклете из {total_pages} страниц")
+    first_side, offset, pages = _signature_of(index, total_pages, signature_sheets)
+    left, right = _side(index - first_side, pages, sheet_count(pages), (pages + 3) // 4, rotate_all, rotate)
+    return (left and left + offset), (right and right + offset)
+
+
+def iter_sheet_sides(total_pages: int, rotate_all: bool = False, rotate: bool = False,
+                     signature_sheets: Optional[int] = None) -> Iterator[SheetSide]:
+    """Ленивая последовательность сторон листов в порядке печати"""
+    if not signature_sheets:
+        sides = sheet_count(total_pages)
+        rows = (total_pages + 3) // 4
+        for index in range(sides):
+            yield _side(index, total_pages, sides, rows, rotate_all, rotate)
+        return
+    for offset in range(0, max(total_pages, 0), 4 * signature_sheets):
+        for left, right in iter_sheet_sides(min(4 * signature_sheets, total_pages - offset), rotate_all, rotate):
+            yield (left and left + offset), (right and right + offset)
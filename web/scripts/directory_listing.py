@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+# Количество элементов на одной странице списка файлового браузера
+DEFAULT_PAGE_SIZE = 200
+# Сколько папок хранится в кэше списков
+DEFAULT_CACHED_DIRS = 32
+
+
+class DirectoryEntry(NamedTuple):
+    name: str
+    # Имя в нижнем регистре - для поиска и сортировки без повторных преобразований
+    key: str
+    is_dir: bool
+
+    @property
+    def is_pdf(self) -> bool:
+        return not self.is_dir and self.key.endswith(".pdf")
+
+
+def scan_directory(path: str) -> List[DirectoryEntry]:
+    """Содержимое папки за один проход os.scandir, сначала папки, потом файлы.
+    Тип элемента берется из результата чтения папки (d_type, данные FindFirstFile),
+    отдельный stat для каждого элемента нужен только файловым системам, которые тип не сообщают."""
+    entries = []
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append(DirectoryEntry(entry.name, entry.name.lower(), is_dir))
+    entries.sort(key=lambda entry: (not entry.is_dir, entry.key))
+    return entries
+
+
+class DirectoryListing:
+    """Списки папок для файлового браузера с кэшем по папкам.
+    Кэш папки действителен, пока не изменилось время изменения папки (оно меняется
+    при создании, удалении и переименовании элементов), поэтому повторный поиск
+    в той же папке стоит одного stat самой папки. Фильтры применяются к именам
+    из кэша, результат отдается страницами (offset, limit)."""
+
+    def __init__(self, max_dirs: int = DEFAULT_CACHED_DIRS):
+        self.max_dirs = max_dirs
+        # Путь папки -> (время изменения, отсортированные элементы)
+        self._cache: "OrderedDict[str, Tuple[int, List[DirectoryEntry]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.scans = 0
+
+    def entries(self, path: str) -> List[DirectoryEntry]:
+        """Все элементы папки из кэша или после нового чтения папки"""
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+        entries = scan_directory(path)
+        with self._lock:
+            self._cache[path] = (mtime, entries)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.max_dirs:
+                self._cache.popitem(last=False)
+            self.scans += 1
+        return entries
+
+    def list(self, path: str, search_query: str = "", only_pdf: bool = False, offset: int = 0,
+             limit: Optional[int] = DEFAULT_PAGE_SIZE) -> dict:
+        """Страница отфильтрованного содержимого папки.
+        total - количество подходящих элементов, has_more - есть ли следующая страница"""
+        search_query = search_query.lower().strip() if search_query else ""
+        offset = max(0, offset)
+        end = offset + limit if limit else None
+        entries = self.entries(path)
+        if not search_query and not only_pdf:
+            # Без фильтров страница - просто срез кэша
+            return self._page(path, entries[offset:end], len(entries), offset)
+
+        matched = []
+        total = 0
+        for entry in entries:
+            # Сначала фильтр по имени, затем по типу
+            if search_query and search_query not in entry.key:
+                continue
+            if only_pdf and not entry.is_dir and not entry.is_pdf:
+                continue
+            if offset <= total and (end is None or total < end):
+                matched.append(entry)
+            total += 1
+        return self._page(path, matched, total, offset)
+
+    @staticmethod
+    def _page(path: str, matched: List[DirectoryEntry], total: int, offset: int) -> dict:
+        return {
+            "contents": [{
+                "name": entry.name,
+                "path": os.path.join(path, entry.name),
+                "is_dir": entry.is_dir,
+                "is_pdf": entry.is_pdf
+            } for entry in matched],
+            "total": total,
+            "offset": offset,
+            "has_more": offset + len(matched) < total
+        }
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(os.path.abspath(path), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached_dirs": len(self._cache), "hits": self.hits, "scans": self.scans}
+
+
+# Общий кэш списков папок процесса приложения
+DIRECTORY_LISTING = DirectoryListing()
@@ -0,0 +1,111 @@
+import fitz  # PyMuPDF
+from typing import Callable, List, Optional, Tuple
+
+# Размер листа A4 (альбомная ориентация) в пунктах PDF
+A4_LANDSCAPE_PT = (842, 595)
+
+
+def _mirror_matrix(rect: fitz.Rect, sheet_height: float, flip_horizontal: bool, flip_vertical: bool) -> bytes:
+    # Отражение относительно центра ячейки листа в координатах PDF (ось Y направлена вверх)
+    center_x = (rect.x0 + rect.x1) / 2
+    center_y = sheet_height - (rect.y0 + rect.y1) / 2
+    a, e = (-1, 2 * center_x) if flip_horizontal else (1, 0)
+    d, f = (-1, 2 * center_y) if flip_vertical else (1, 0)
+    return f"{a} 0 0 {d} {e:g} {f:g} cm".encode()
+
+
+def _place_page(sheet: fitz.Page, target: fitz.Rect, src: fitz.Document, page_index: int, rotate: int,
+                flip_horizontal: bool = False, flip_vertical: bool = False) -> None:
+    """Размещает страницу в ячейке листа как векторный XObject.
+    Отражение выполняется матрицей вокруг потока содержимого, добавленного show_pdf_page."""
+    contents_before = set(sheet.get_contents())
+    sheet.show_pdf_page(target, src, page_index, rotate=rotate)
+    if not (flip_horizontal or flip_vertical):
+        return
+
+    doc = sheet.parent
+    matrix = _mirror_matrix(target, sheet.rect.height, flip_horizontal, flip_vertical)
+    for xref in sheet.get_contents():
+        if xref in contents_before:
+            continue
+        content = doc.xref_stream(xref)
+        doc.update_stream(xref, b"q " + matrix + b"\n" + content + b"\nQ")
+
+
+def _derotate_page(page: fitz.Page) -> None:
+    """Переносит поворот /Rotate в содержимое страницы: страница без поворота выглядит так же,
+    ее MediaBox - видимая часть (CropBox), повернутая на /Rotate, с началом в (0, 0)"""
+    doc = page.parent
+    # CropBox без поворота в координатах PDF (ось Y направлена вверх);
+    # page.cropbox отсчитывается вниз от верхнего края MediaBox
+    crop, top = page.cropbox, page.mediabox.y1
+    x0, y0, x1, y1 = crop.x0, top - crop.y1, crop.x1, top - crop.y0
+    # /Rotate поворачивает страницу по часовой стрелке: та же матрица переводит содержимое в новую страницу
+    a, b, c, d, e, f = {
+        90: (0, -1, 1, 0, -y0, x1),
+        180: (-1, 0, 0, -1, x1, y1),
+        270: (0, 1, -1, 0, y1, -x0)
+    }[page.rotation]
+    width, height = (y1 - y0, x1 - x0) if page.rotation in (90, 270) else (x1 - x0, y1 - y0)
+
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, f"q {a} {b} {c} {d} {e:g} {f:g} cm\n".encode() + page.read_contents() + b"\nQ")
+    page.set_contents(xref)
+    page.set_rotation(0)
+    page.set_mediabox(fitz.Rect(0, 0, width, height))
+
+
+def _prepare_source(src: fitz.Document) -> None:
+    """Готовит исходный документ для show_pdf_page (изменения только в памяти, файл не меняется).
+    show_pdf_page переносит только поток содержимого, поэтому аннотации и поля форм впекаются в него.
+    Повернутую (/Rotate) страницу show_pdf_page обрезает по повернутому прямоугольнику и не поворачивает,
+    поэтому поворот переносится в содержимое: страница выглядит как при рендеринге."""
+    if src.has_annots() or src.is_form_pdf:
+        src.bake()
+    for page in src:
+        if page.rotation:
+            _derotate_page(page)
+
+
+def impose_vector(input_pdf_path: str, output_pdf_path: str, booklet_pairs: List[Tuple[Optional[int], Optional[int]]],
+                  flip_horizontal: bool = False, flip_vertical: bool = False,
+                  sheet_size: Tuple[float, float] = A4_LANDSCAPE_PT,
+                  progress_callback: Optional[Callable[[str, int], None]] = None,
+                  cancel_check: Optional[Callable[[], None]] = None) -> int:
+    """Раскладывает исходные страницы на листы буклета без растеризации.
+    Повторяет логику create_combined_page: альбомные страницы поворачиваются на 90°,
+    на обратной стороне применяются отражения. Возвращает количество листов."""
+    src = fitz.open(input_pdf_path)
+    output = fitz.open()
+    sheet_width, sheet_height = sheet_size
+    half_width = sheet_width / 2
+
+    try:
+        _prepare_source(src)
+        for i, (left_num, right_num) in enumerate(booklet_pairs):
+            # Контрольная точка отмены между листами
+            if cancel_check is not None:
+                cancel_check()
+            is_back_side = (i % 2 == 1)
+            sheet = output.new_page(width=sheet_width, height=sheet_height)
+
+            for slot, page_num in enumerate((left_num, right_num)):
+                if not page_num:
+                    continue
+                page_index = page_num - 1
+                # Видимый прямоугольник страницы (поворот /Rotate уже в содержимом, см. _prepare_source).
+                # Как и в растровом режиме, книжные страницы не поворачиваются
+                src_rect = src[page_index].rect
+                rotate = 0 if src_rect.height > src_rect.width else 90
+                target = fitz.Rect(slot * half_width, 0, (slot + 1) * half_width, sheet_height)
+                _place_page(sheet, target, src, page_index, rotate,
+                            is_back_side and flip_horizontal, is_back_side and flip_vertical)
+            if progress_callback is not None:
+                progress_callback("sheets_composed", 1)
+
+        output.save(output_pdf_path, garbage=3, deflate=True)
+        return len(output)
+    finally:
+        output.close()
+        src.close()
@@ -0,0 +1,227 @@
+import datetime
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Статусы заданий
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_DONE, JOB_ERROR, JOB_CANCELLED)
+
+# Количество одновременно выполняемых заданий по умолчанию
+DEFAULT_JOB_WORKERS = 2
+# Сколько хранится завершенное задание, итог которого никто не забрал (с)
+FINISHED_JOB_TTL = 10 * 60
+
+
+class JobCancelledError(Exception):
+    """Задание остановлено в контрольной точке: отменено пользователем или превысило бюджет"""
+
+
+class JobTimeoutError(JobCancelledError):
+    pass
+
+
+class JobMemoryError(JobCancelledError):
+    pass
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Текущий объем резидентной памяти процесса или None, если его не узнать"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+class BookletJob:
+    """Фоновое задание: статус, счетчики прогресса и результат"""
+
+    def __init__(self, kind: str, timeout: Optional[float] = None, max_rss_bytes: Optional[int] = None):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = JOB_QUEUED
+        self.progress: Dict[str, int] = {
+            "pages_rendered": 0,
+            "sheets_composed": 0,
+            "bytes_written": 0
+        }
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.datetime.now().isoformat()
+        self.finished_at: Optional[str] = None
+        # Время завершения по монотонным часам - для удаления забытых заданий
+        self.finished_monotonic: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self._lock = threading.Lock()
+        # Бюджет: время выполнения задания (с) и общий для всех заданий потолок памяти процесса (байт)
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_bytes
+        self._started: Optional[float] = None
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+
+    def check_cancelled(self) -> None:
+        """Контрольная точка для PDFBookletCreator: прерывает задание исключением JobCancelledError"""
+        if self.cancel_event.is_set():
+            raise JobCancelledError("Задание отменено пользователем")
+        if self.timeout and self._started is not None and time.monotonic() - self._started > self.timeout:
+            raise JobTimeoutError(f"Превышено время выполнения задания ({self.timeout:g} с)")
+        if self.max_rss_bytes is not None:
+            rss = current_rss_bytes()
+            if rss is not None and rss > self.max_rss_bytes:
+                raise JobMemoryError(f"Превышен потолок памяти приложения ({rss // (1024 * 1024)} МБ "
+                                     f"из {self.max_rss_bytes // (1024 * 1024)} МБ)")
+
+    def report_progress(self, event: str, value: int = 1) -> None:
+        """Обработчик прогресса для PDFBookletCreator.
+        Счетчики с префиксом total_ задают общее количество, остальные увеличиваются на value."""
+        with self._lock:
+            if event.startswith("total_"):
+                self.progress[event] = value
+            else:
+                self.progress[event] = self.progress.get(event, 0) + value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            progress = dict(self.progress)
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    """Очередь заданий с ограниченным пулом потоков.
+    Задания выполняются вне цикла событий eel; интерфейс получает их состояние
+    через drain_events(), который вызывается из гринлета eel.
+    Завершенное задание удаляется, когда интерфейс подтвердил получение его итога
+    (acknowledge), а неподтвержденное - через finished_ttl секунд после завершения.
+    Чтение статуса (get_status) задание не удаляет: итог доступен и опросу,
+    и событию drain_events, в каком бы порядке они ни пришли.
+
+    memory_budget_mb - бюджет памяти процесса, а не отдельного задания: задания
+    выполняются в одном процессе, и их память по RSS не разделить. Потолок
+    (RSS при создании менеджера плюс бюджет) общий для всех заданий; при его
+    превышении отменяются задания, дошедшие до контрольной точки."""
+
+    def __init__(self, max_workers: int = DEFAULT_JOB_WORKERS, job_timeout: Optional[float] = None,
+                 memory_budget_mb: Optional[int] = None, finished_ttl: float = FINISHED_JOB_TTL):
+        self.job_timeout = job_timeout
+        self.memory_budget_mb = memory_budget_mb
+        baseline_rss = current_rss_bytes() if memory_budget_mb else None
+        # Потолок RSS процесса, отсчитанный один раз от памяти до запуска заданий
+        self.max_rss_bytes = baseline_rss + memory_budget_mb * 1024 * 1024 if baseline_rss is not None else None
+        self.finished_ttl = finished_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="booklet_job")
+        self._jobs: Dict[str, BookletJob] = {}
+        self._lock = threading.Lock()
+        # Последний отправленный интерфейсу снимок каждого задания
+        self._sent: Dict[str, dict] = {}
+
+    def submit(self, kind: str, func: Callable[..., dict], *args, **kwargs) -> BookletJob:
+        """Ставит задание в очередь. func получает задание первым аргументом и возвращает результат"""
+        job = BookletJob(kind, timeout=self.job_timeout, max_rss_bytes=self.max_rss_bytes)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        job.future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job: BookletJob, func: Callable[..., dict], args: tuple, kwargs: dict) -> None:
+        if job.cancel_event.is_set():
+            self._finish(job, JOB_CANCELLED)
+            return
+        job.status = JOB_RUNNING
+        job.start()
+        try:
+            job.result = func(job, *args, **kwargs)
+            self._finish(job, JOB_DONE)
+        except JobCancelledError as e:
+            job.error = str(e)
+            self._finish(job, JOB_CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, JOB_ERROR)
+
+    def _finish(self, job: BookletJob, status: str) -> None:
+        job.finished_at = datetime.datetime.now().isoformat()
+        job.finished_monotonic = time.monotonic()
+        # Статус последним: задание с финальным статусом уже полностью заполнено
+        job.status = status
+
+    def acknowledge(self, job_id: str) -> bool:
+        """Интерфейс получил итог задания: завершенное задание и его результат больше не нужны"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in FINISHED_STATUSES:
+                return False
+            del self._jobs[job_id]
+            self._sent.pop(job_id, None)
+        return True
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.status in FINISHED_STATUSES and job.finished_monotonic is not None
+                       and now - job.finished_monotonic > self.finished_ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._sent.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[BookletJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_status(self, job_id: str) -> Optional[dict]:
+        job = self.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return False
+        job.cancel_event.set()
+        # Задание еще в очереди - снимаем его сразу
+        if job.future is not None and job.future.cancel():
+            self._finish(job, JOB_CANCELLED)
+        return True
+
+    def drain_events(self) -> List[dict]:
+        """Возвращает снимки заданий, изменившихся с прошлого вызова"""
+        self._evict_expired()
+        events = []
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            snapshot = job.to_dict()
+            # Финальный снимок тоже отправляется один раз; задание остается до acknowledge или TTL
+            if self._sent.get(job.job_id) != snapshot:
+                self._sent[job.job_id] = snapshot
+                events.append(snapshot)
+        return events
+
+    def shutdown(self) -> None:
+        for job in list(self._jobs.values()):
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
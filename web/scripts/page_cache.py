@@ -0,0 +1,99 @@
+import hashlib
+import os
+import threading
+from typing import Optional, Union
+from PIL import Image
+from web.scripts.log_app import LOG_DIR
+
+# Папка дискового кэша отрендеренных страниц
+PAGE_CACHE_DIR = os.path.join(LOG_DIR, "page_cache")
+# Ограничение размера кэша по умолчанию (МБ)
+DEFAULT_PAGE_CACHE_LIMIT_MB = 1024
+
+
+def file_content_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Хэш содержимого файла: ключ кэша не зависит от имени и пути файла"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def trim_cache_dir(cache_dir: str, max_bytes: int, extension: str) -> int:
+    """Вытеснение LRU для дискового кэша: удаляет файлы с расширением extension,
+    начиная с давно не использованных (время доступа хранится в mtime), пока их общий
+    размер больше max_bytes. Возвращает количество освобожденных байт."""
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if not entry.name.endswith(extension):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    freed = 0
+    entries.sort()
+    for _, size, path in entries:
+        if total - freed <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            freed += size
+        except OSError:
+            pass
+    return freed
+
+
+class PageCache:
+    """Дисковый кэш растеризованных страниц с вытеснением LRU по размеру.
+    Записи хранятся в PNG без потерь, время последнего доступа - в mtime файла."""
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR, max_mb: int = DEFAULT_PAGE_CACHE_LIMIT_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, content_hash: str, page_num: int, variant: Union[int, str]) -> str:
+        # variant - DPI рендеринга или описание размера, под который отрендерена страница
+        return os.path.join(self.cache_dir, f"{content_hash}_{page_num}_{variant}.png")
+
+    def get(self, content_hash: str, page_num: int, variant: Union[int, str]) -> Optional[Image.Image]:
+        path = self._entry_path(content_hash, page_num, variant)
+        try:
+            with Image.open(path) as cached:
+                img = cached.convert("RGB")
+            # Обновляем время доступа для LRU
+            os.utime(path, None)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return img
+
+    def put(self, content_hash: str, page_num: int, variant: Union[int, str], img: Image.Image) -> None:
+        path = self._entry_path(content_hash, page_num, variant)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            img.save(temp_path, "PNG", compress_level=1)
+            # Атомарная замена: параллельные задания не увидят недописанный файл
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def trim(self) -> int:
+        """Удаляет давно не использованные записи, пока кэш больше лимита.
+        Возвращает количество освобожденных байт."""
+        return trim_cache_dir(self.cache_dir, self.max_bytes, ".png")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
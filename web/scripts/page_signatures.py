@@ -0,0 +1,41 @@
+import hashlib
+from typing import List, Optional
+
+# Операторы, которые ничего не рисуют: поток только из них считается пустой страницей
+_NOOP_OPERATORS = {b"q", b"Q"}
+
+
+def page_signature(page) -> Optional[str]:
+    """Отпечаток страницы по потоку содержимого, ресурсам, аннотациям и геометрии.
+    Страницы с равными отпечатками выглядят одинаково; None - пустая страница."""
+    doc = page.parent
+    contents = page.read_contents()
+    annots = doc.xref_get_key(page.xref, "Annots")[1]
+    if annots == "null" and set(contents.split()) <= _NOOP_OPERATORS:
+        return None
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(contents)
+    # Ресурсы сравниваем по ссылкам на объекты: одинаковый поток с другими шрифтами
+    # или изображениями - уже другая страница
+    for key in ("Resources", "Annots"):
+        digest.update(b"\0" + doc.xref_get_key(page.xref, key)[1].encode())
+    digest.update(f"\0{tuple(page.rect)}\0{page.rotation}".encode())
+    return digest.hexdigest()
+
+
+def page_aliases(pdf_path: str) -> List[Optional[int]]:
+    """Для каждой страницы - индекс первой страницы с тем же содержимым
+    (для уникальной страницы - ее собственный индекс), для пустой страницы - None.
+    Рендерить и масштабировать достаточно только страницы, ссылающиеся сами на себя."""
+    import fitz  # PyMuPDF
+    aliases: List[Optional[int]] = []
+    first_seen = {}
+    with fitz.open(pdf_path) as pdf_document:
+        for page_num in range(len(pdf_document)):
+            signature = page_signature(pdf_document.load_page(page_num))
+            if signature is None:
+                aliases.append(None)
+            else:
+                aliases.append(first_seen.setdefault(signature, page_num))
+    return aliases
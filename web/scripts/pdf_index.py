@@ -0,0 +1,240 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional
+
+from web.scripts.log_app import LOG_DIR, log_server_action
+
+# База индекса PDF файлов
+PDF_INDEX_PATH = os.path.join(LOG_DIR, "pdf_index.sqlite3")
+# Период инкрементального пересканирования (с)
+DEFAULT_RESCAN_INTERVAL = 5 * 60
+# Каждый N-й проход читает все папки, а не только изменившиеся
+# (время изменения папки не меняется при перезаписи файла на месте)
+DEFAULT_FULL_RESCAN_EVERY = 12
+# Количество результатов поиска по умолчанию
+DEFAULT_SEARCH_LIMIT = 50
+# Сколько файлов открывается для подсчета страниц между записями в базу
+PAGE_COUNT_BATCH = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pdfs (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    path_key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    pages INTEGER
+);
+CREATE INDEX IF NOT EXISTS pdfs_dir ON pdfs (dir);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+"""
+
+
+def _count_pages(path: str) -> int:
+    # Количество страниц; -1 - файл не открывается как PDF
+    import fitz  # PyMuPDF
+    try:
+        with fitz.open(path) as pdf_document:
+            return pdf_document.page_count
+    except Exception:
+        return -1
+
+
+class PdfIndex:
+    """Фоновый индекс PDF файлов в папках roots (SQLite).
+    Хранит путь, размер, время изменения и количество страниц каждого PDF.
+    Проход индексации читает только папки, время изменения которых отличается от
+    записанного в базе (создание, удаление, переименование файлов); для
+    неизменившихся папок список подпапок берется из базы. Подсчет страниц выполняется
+    после обхода, поэтому новые файлы находятся поиском сразу, а количество страниц
+    появляется позже. Скрытые папки (с точки в начале имени) не индексируются."""
+
+    def __init__(self, roots: Iterable[str], db_path: str = PDF_INDEX_PATH,
+                 interval: float = DEFAULT_RESCAN_INTERVAL, full_rescan_every: int = DEFAULT_FULL_RESCAN_EVERY):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.db_path = db_path
+        self.interval = interval
+        self.full_rescan_every = full_rescan_every
+        self.passes = 0
+        self.last_pass: Optional[dict] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._scan_lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Отдельное соединение на вызов: индексация и поиск идут из разных потоков
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _delete_subtree(conn: sqlite3.Connection, path: str) -> int:
+        # Удаляет папку и все вложенные в нее записи; возвращает количество удаленных PDF
+        prefix = path.rstrip(os.sep) + os.sep
+        removed = conn.execute("DELETE FROM pdfs WHERE dir = ? OR substr(dir, 1, ?) = ?",
+                               (path, len(prefix), prefix)).rowcount
+        conn.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (path, len(prefix), prefix))
+        return removed
+
+    def _scan_dir(self, conn: sqlite3.Connection, path: str, parent: Optional[str], force: bool,
+                  stats: dict) -> List[str]:
+        # Обновляет записи одной папки и возвращает ее подпапки
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            stats["pdfs_removed"] += self._delete_subtree(conn, path)
+            return []
+        row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == mtime_ns and not force:
+            stats["dirs_skipped"] += 1
+            return [child for child, in conn.execute("SELECT path FROM dirs WHERE parent = ?", (path,))]
+
+        stats["dirs_scanned"] += 1
+        subdirs = []
+        found = {}
+        try:
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith("."):
+                                subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(".pdf") and entry.is_file():
+                            stat = entry.stat()
+                            found[entry.path] = (entry.name, stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            # Нет доступа к папке: оставляем записи как есть до следующего прохода
+            return []
+
+        known = {file_path: (size, mtime) for file_path, size, mtime
+                 in conn.execute("SELECT path, size, mtime_ns FROM pdfs WHERE dir = ?", (path,))}
+        for file_path in known.keys() - found.keys():
+            conn.execute("DELETE FROM pdfs WHERE path = ?", (file_path,))
+            stats["pdfs_removed"] += 1
+        for file_path, (name, size, mtime) in found.items():
+            if known.get(file_path) == (size, mtime):
+                continue
+            # Новый или измененный файл: количество страниц пересчитывается позже
+            conn.execute("INSERT OR REPLACE INTO pdfs (path, dir, name, name_key, path_key, size, mtime_ns, pages) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+                         (file_path, path, name, name.lower(), file_path.lower(), size, mtime))
+            stats["pdfs_updated"] += 1
+
+        for child, in conn.execute("SELECT path FROM dirs WHERE parent = ?", (path,)).fetchall():
+            if child not in subdirs:
+                stats["pdfs_removed"] += self._delete_subtree(conn, child)
+        conn.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                     (path, parent, mtime_ns))
+        return subdirs
+
+    def _count_missing_pages(self, conn: sqlite3.Connection, stats: dict) -> None:
+        while not self._stop_event.is_set():
+            paths = [path for path, in conn.execute("SELECT path FROM pdfs WHERE pages IS NULL LIMIT ?",
+                                                    (PAGE_COUNT_BATCH,))]
+            if not paths:
+                return
+            for path in paths:
+                conn.execute("UPDATE pdfs SET pages = ? WHERE path = ?", (_count_pages(path), path))
+            conn.commit()
+            stats["pages_counted"] += len(paths)
+
+    def rescan(self, force: bool = False) -> dict:
+        """Один проход индексации. С force читаются все папки, а не только изменившиеся"""
+        started = time.perf_counter()
+        stats = {"dirs_scanned": 0, "dirs_skipped": 0, "pdfs_updated": 0, "pdfs_removed": 0, "pages_counted": 0}
+        with self._scan_lock, self._connect() as conn:
+            # Корневые папки, убранные из настроек
+            for root, in conn.execute("SELECT path FROM dirs WHERE parent IS NULL").fetchall():
+                if root not in self.roots:
+                    stats["pdfs_removed"] += self._delete_subtree(conn, root)
+            for root in self.roots:
+                stack = [(root, None)]
+                while stack and not self._stop_event.is_set():
+                    path, parent = stack.pop()
+                    stack.extend((child, path) for child in self._scan_dir(conn, path, parent, force, stats))
+                conn.commit()
+            self._count_missing_pages(conn, stats)
+        self.passes += 1
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        self.last_pass = stats
+        if stats["pdfs_updated"] or stats["pdfs_removed"]:
+            log_server_action('Индекс PDF обновлен', 'info', dict(stats, roots=self.roots))
+        return stats
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[dict]:
+        """PDF, в пути которых есть все слова запроса, лучшие совпадения первыми:
+        имя целиком, начало имени, запрос внутри имени, все слова в имени, только в пути.
+        При равенстве - более короткие имена и более новые файлы"""
+        query = query.lower().strip()
+        terms = query.split()
+        if not terms:
+            return []
+        conditions = " AND ".join("instr(path_key, ?) > 0" for _ in terms)
+        in_name = " AND ".join("instr(name_key, ?) > 0" for _ in terms)
+        sql = (f"SELECT path, name, size, mtime_ns, pages, "
+               f"CASE WHEN name_key = ? OR name_key = ? THEN 0 "
+               f"WHEN substr(name_key, 1, ?) = ? THEN 1 "
+               f"WHEN instr(name_key, ?) > 0 THEN 2 "
+               f"WHEN {in_name} THEN 3 ELSE 4 END AS rank "
+               f"FROM pdfs WHERE {conditions} "
+               f"ORDER BY rank, length(name), mtime_ns DESC LIMIT ?")
+        params = [query, query + ".pdf", len(query), query, query, *terms, *terms, limit]
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{
+            "name": name,
+            "path": path,
+            "size": size,
+            "mtime": mtime_ns / 1e9,
+            "pages": pages if pages is not None and pages >= 0 else None
+        } for path, name, size, mtime_ns, pages, _ in rows]
+
+    def status(self) -> dict:
+        with self._connect() as conn:
+            files, pending = conn.execute("SELECT count(*), count(*) - count(pages) FROM pdfs").fetchone()
+        return {"roots": self.roots, "files": files, "pages_pending": pending, "passes": self.passes,
+                "last_pass": self.last_pass, "running": self._thread is not None and self._thread.is_alive()}
+
+    def _loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                force = self.full_rescan_every > 0 and self.passes % self.full_rescan_every == self.full_rescan_every - 1
+                self.rescan(force=force)
+            except Exception as e:
+                log_server_action('Ошибка индексации PDF', 'error', {'error': str(e)})
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> "PdfIndex":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, name="pdf_index", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,170 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from web.scripts.log_app import LOG_DIR
+from web.scripts.page_cache import trim_cache_dir
+
+# Папка дискового кэша сведений о PDF для файлового браузера
+PDF_METADATA_DIR = os.path.join(LOG_DIR, "pdf_metadata")
+# Ограничение размера кэша по умолчанию (МБ)
+DEFAULT_METADATA_LIMIT_MB = 64
+# Размер миниатюры первой страницы (вписывается с сохранением пропорций)
+THUMBNAIL_SIZE = (96, 128)
+THUMBNAIL_QUALITY = 70
+# Количество потоков разбора PDF: PyMuPDF не рассчитан на одновременную работу
+# из нескольких потоков, поэтому по умолчанию файлы разбираются по одному в фоне
+DEFAULT_METADATA_WORKERS = 1
+# Сколько записей хранится в памяти перед дисковым кэшем
+MEMORY_ENTRIES = 2048
+# Проверка размера дискового кэша после стольких новых записей
+TRIM_EVERY = 200
+# Точек PDF в миллиметре
+_POINTS_PER_MM = 72 / 25.4
+
+
+def read_pdf_metadata(path: str) -> dict:
+    """Количество страниц, размер первой страницы (мм) и миниатюра первой страницы (data URL JPEG)"""
+    import fitz  # PyMuPDF
+    with fitz.open(path) as pdf_document:
+        metadata = {"pages": pdf_document.page_count, "width_mm": None, "height_mm": None, "thumbnail": None}
+        if pdf_document.page_count:
+            page = pdf_document.load_page(0)
+            rect = page.rect
+            metadata["width_mm"] = round(rect.width / _POINTS_PER_MM)
+            metadata["height_mm"] = round(rect.height / _POINTS_PER_MM)
+            zoom = min(THUMBNAIL_SIZE[0] / rect.width, THUMBNAIL_SIZE[1] / rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            metadata["thumbnail"] = ("data:image/jpeg;base64," +
+                                     base64.b64encode(pix.tobytes("jpg", jpg_quality=THUMBNAIL_QUALITY)).decode("ascii"))
+    return metadata
+
+
+class PdfMetadataCache:
+    """Сведения о PDF для файлового браузера: вычисляются в пуле потоков и кэшируются
+    на диске по пути, размеру и времени изменения файла.
+    request() только ставит файлы в очередь и сразу возвращается; готовые сведения
+    (из кэша или после разбора) забираются через drain_results(). Запросы прошлых
+    списков, которые еще не начали выполняться, отменяются новым поколением (next_generation)."""
+
+    def __init__(self, cache_dir: str = PDF_METADATA_DIR, max_mb: int = DEFAULT_METADATA_LIMIT_MB,
+                 workers: int = DEFAULT_METADATA_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.parsed = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf_metadata")
+        self._memory: "OrderedDict[str, dict]" = OrderedDict()
+        self._results: List[dict] = []
+        self._generation = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(path: str, stat: os.stat_result) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def next_generation(self) -> int:
+        """Новый список файлов: еще не начатые запросы прошлых списков не выполняются"""
+        with self._lock:
+            self._generation += 1
+            return self._generation
+
+    def request(self, paths: Iterable[str], generation: Optional[int] = None) -> int:
+        """Ставит PDF в очередь разбора, не дожидаясь результата. Возвращает количество файлов"""
+        if generation is None:
+            generation = self._generation
+        count = 0
+        for path in paths:
+            self._executor.submit(self._resolve, path, generation)
+            count += 1
+        return count
+
+    def _resolve(self, path: str, generation: int) -> None:
+        if generation != self._generation:
+            return
+        try:
+            metadata = self.get(path)
+        except OSError as e:
+            metadata = {"error": str(e)}
+        with self._lock:
+            self._results.append(dict(metadata, path=path, generation=generation))
+
+    def get(self, path: str) -> dict:
+        """Сведения о PDF из кэша или после разбора файла (блокирующий вызов)"""
+        key = self._key(path, os.stat(path))
+        with self._lock:
+            metadata = self._memory.get(key)
+            if metadata is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return metadata
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, encoding="utf-8") as f:
+                metadata = json.load(f)
+            # Время доступа для вытеснения давно не использованных записей
+            os.utime(entry_path, None)
+            with self._lock:
+                self.hits += 1
+        except (OSError, ValueError):
+            try:
+                metadata = read_pdf_metadata(path)
+            except Exception as e:
+                # Поврежденный файл тоже кэшируется, чтобы не разбирать его при каждом открытии папки
+                metadata = {"pages": None, "width_mm": None, "height_mm": None, "thumbnail": None, "error": str(e)}
+                with self._lock:
+                    self.failed += 1
+            self._store(entry_path, metadata)
+        with self._lock:
+            self._memory[key] = metadata
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+        return metadata
+
+    def _store(self, entry_path: str, metadata: dict) -> None:
+        temp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(metadata, f)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        with self._lock:
+            self.parsed += 1
+            self._writes += 1
+            trim = self._writes % TRIM_EVERY == 0
+        if trim:
+            self.trim()
+
+    def drain_results(self) -> List[dict]:
+        """Готовые сведения текущего поколения с прошлого вызова"""
+        with self._lock:
+            results, self._results = self._results, []
+            generation = self._generation
+        return [result for result in results if result.pop("generation") == generation]
+
+    def trim(self) -> int:
+        """Удаляет давно не использованные записи, пока кэш больше лимита.
+        Возвращает количество освобожденных байт."""
+        return trim_cache_dir(self.cache_dir, self.max_bytes, ".json")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "parsed": self.parsed, "failed": self.failed}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,142 @@
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+# Ограничение объема закодированных превью в памяти по умолчанию (МБ)
+DEFAULT_PREVIEW_STORE_MB = 128
+# Сколько последних заданий хранится (превью старых заданий удаляются целиком)
+DEFAULT_PREVIEW_JOBS = 4
+# Путь, по которому интерфейс запрашивает превью (см. маршрут в start.py)
+PREVIEW_ROUTE_PREFIX = "previews"
+
+PreviewProducer = Callable[[], bytes]
+# Кодирование превью листа по номеру - для заданий, которые не регистрируют листы по одному
+SheetRenderer = Callable[[int], bytes]
+
+
+def preview_url(job_id: str, index: int) -> str:
+    """Адрес превью листа index (с 0) задания job_id для веб-интерфейса"""
+    return f"{PREVIEW_ROUTE_PREFIX}/{job_id}/{index + 1}.jpg"
+
+
+class PreviewStore:
+    """Превью листов в памяти вместо JPEG файлов на диске.
+    Для каждого листа задание регистрирует функцию, которая кодирует превью (put),
+    или одну функцию для всех листов по номеру (put_job);
+    кодирование выполняется только при первом запросе превью интерфейсом.
+    Закодированные превью хранятся с вытеснением LRU по объему, вытесненное
+    превью при следующем запросе кодируется заново."""
+
+    def __init__(self, max_mb: int = DEFAULT_PREVIEW_STORE_MB, max_jobs: int = DEFAULT_PREVIEW_JOBS):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_jobs = max_jobs
+        # job_id -> {номер листа: функция кодирования}, от старых заданий к новым
+        self._producers: "OrderedDict[str, Dict[int, PreviewProducer]]" = OrderedDict()
+        # job_id -> (количество листов, кодирование листа по номеру) для заданий из put_job
+        self._renderers: Dict[str, Tuple[int, SheetRenderer]] = {}
+        # (job_id, номер листа) -> JPEG
+        self._data: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.encoded = 0
+        self._lock = threading.Lock()
+        # Кодирование превью выполняется по одному: функции кодирования используют PyMuPDF
+        self._encode_lock = threading.Lock()
+
+    def put(self, job_id: str, index: int, producer: PreviewProducer) -> str:
+        """Регистрирует превью листа index и возвращает его адрес для интерфейса"""
+        with self._lock:
+            self._job_sheets(job_id)[index] = producer
+            self._discard((job_id, index))
+        return preview_url(job_id, index)
+
+    def put_job(self, job_id: str, sheet_count: int, renderer: SheetRenderer) -> None:
+        """Регистрирует превью всех листов задания одной функцией renderer(номер листа).
+        Регистрация не зависит от количества листов: функция кодирования листа
+        создается только при его первом запросе"""
+        with self._lock:
+            self._job_sheets(job_id)
+            self._renderers[job_id] = (sheet_count, renderer)
+
+    def _job_sheets(self, job_id: str) -> Dict[int, PreviewProducer]:
+        # Листы задания; новое задание вытесняет самые старые сверх max_jobs
+        sheets = self._producers.get(job_id)
+        if sheets is None:
+            sheets = self._producers[job_id] = {}
+            while len(self._producers) > self.max_jobs:
+                old_job, _ = self._producers.popitem(last=False)
+                self._renderers.pop(old_job, None)
+                self._drop_data(old_job)
+        return sheets
+
+    def _producer(self, job_id: str, index: int) -> Optional[PreviewProducer]:
+        sheets = self._producers.get(job_id)
+        if sheets is None:
+            return None
+        producer = sheets.get(index)
+        if producer is None and job_id in self._renderers:
+            sheet_count, renderer = self._renderers[job_id]
+            if 0 <= index < sheet_count:
+                producer = sheets[index] = functools.partial(renderer, index)
+        return producer
+
+    def get(self, job_id: str, index: int) -> Optional[bytes]:
+        """JPEG превью листа; None, если задания или листа нет"""
+        key = (job_id, index)
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return data
+            producer = self._producer(job_id, index)
+        if producer is None:
+            return None
+
+        with self._encode_lock:
+            data = producer()
+        with self._lock:
+            # Задание могли удалить, пока кодировалось превью - тогда не сохраняем
+            if self._producers.get(job_id, {}).get(index) is producer:
+                self._discard(key)
+                self._data[key] = data
+                self.current_bytes += len(data)
+                while self.current_bytes > self.max_bytes and len(self._data) > 1:
+                    _, evicted = self._data.popitem(last=False)
+                    self.current_bytes -= len(evicted)
+            self.encoded += 1
+        return data
+
+    def has_job(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._producers
+
+    def drop_job(self, job_id: str) -> None:
+        with self._lock:
+            self._producers.pop(job_id, None)
+            self._renderers.pop(job_id, None)
+            self._drop_data(job_id)
+
+    def _discard(self, key: Tuple[str, int]) -> None:
+        data = self._data.pop(key, None)
+        if data is not None:
+            self.current_bytes -= len(data)
+
+    def _drop_data(self, job_id: str) -> None:
+        for key in [key for key in self._data if key[0] == job_id]:
+            self._discard(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "jobs": len(self._producers),
+                "cached_previews": len(self._data),
+                "cached_bytes": self.current_bytes,
+                "hits": self.hits,
+                "encoded": self.encoded
+            }
+
+
+# Общее хранилище превью процесса приложения
+PREVIEW_STORE = PreviewStore()
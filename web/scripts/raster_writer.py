@@ -0,0 +1,251 @@
+import io
+import zlib
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+from PIL import Image, ImageChops
+
+# Способы сжатия листов
+ENCODING_JPEG = "jpeg"
+ENCODING_FLATE = "flate"
+# JPEG для цветных и серых листов, 1 бит Flate для черно-белых (текст)
+ENCODING_AUTO = "auto"
+RASTER_ENCODINGS = (ENCODING_AUTO, ENCODING_JPEG, ENCODING_FLATE)
+
+# Виды листов по содержимому
+SHEET_COLOR = "color"
+SHEET_GRAY = "gray"
+SHEET_BILEVEL = "bilevel"
+
+# Максимальное расхождение каналов, при котором лист считается серым
+GRAY_TOLERANCE = 8
+# Допустимая доля полутонов среди небелых пикселей черно-белого листа в режиме auto:
+# у текста полутона - только сглаженные края букв, у заливок и фотографий - почти все пиксели
+BILEVEL_MAX_MIDTONES = 0.5
+# Полутоном считается яркость дальше этого расстояния от черного и белого
+BILEVEL_MARGIN = 48
+# Яркость, начиная с которой пиксель считается белой бумагой; светлые заливки темнее
+# этого порога - полутона, иначе порог 128 превратил бы их в белый фон
+BILEVEL_PAPER = 248
+# Во сколько раз уменьшается лист при поиске цвета в режимах с потерями
+CLASSIFY_REDUCE = 4
+
+
+# Порог перевода серого листа в черно-белый
+_BILEVEL_TABLE = [255 if value >= 128 else 0 for value in range(256)]
+
+
+class EncodedSheet(NamedTuple):
+    """Закодированный лист: можно записать в файл сразу или переиспользовать в следующем задании"""
+    data: bytes
+    width: int
+    height: int
+    color_space: str
+    bits_per_component: int
+    filter: str
+    kind: str
+
+
+def classify_sheet(img: Image.Image, lossy: bool = True) -> str:
+    """Определяет вид листа: цветной, серый или черно-белый.
+    При lossy=False серым считается только лист с равными каналами,
+    а черно-белым - только лист из чистых черного и белого."""
+    return _classify(img, lossy)[0]
+
+
+def _classify(img: Image.Image, lossy: bool) -> Tuple[str, Optional[Image.Image]]:
+    # Возвращает вид листа и его серую версию (None для цветного листа)
+    if img.mode not in ("L", "1"):
+        # В режиме с потерями цвет ищем на уменьшенной копии: усреднение 4x4 ослабляет,
+        # но не убирает даже тонкие цветные линии, а проверка становится в разы быстрее
+        sample = img.reduce(CLASSIFY_REDUCE) if lossy else img
+        red, green, blue = sample.split()[:3]
+        tolerance = GRAY_TOLERANCE if lossy else 0
+        if (ImageChops.difference(red, green).getextrema()[1] > tolerance or
+                ImageChops.difference(green, blue).getextrema()[1] > tolerance):
+            return SHEET_COLOR, None
+        gray = img.convert("L")
+    else:
+        gray = img
+    sample = gray
+    if lossy:
+        # Гистограмма по равномерной выборке пикселей (без усреднения, чтобы не размыть края букв)
+        sample = gray.resize((max(1, gray.width // 2), max(1, gray.height // 2)), Image.NEAREST)
+    histogram = sample.histogram()
+    margin, paper = (BILEVEL_MARGIN, BILEVEL_PAPER) if lossy else (1, 255)
+    midtones = sum(histogram[margin:paper])
+    marked = sum(histogram[:paper])
+    if midtones <= (BILEVEL_MAX_MIDTONES * marked if lossy else 0):
+        return SHEET_BILEVEL, gray
+    return SHEET_GRAY, gray
+
+
+def _jpeg(img: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def encode_sheet(img: Image.Image, encoding: str = ENCODING_JPEG, jpeg_quality: int = 75) -> EncodedSheet:
+    """Кодирует лист для RasterPdfWriter.add_encoded_sheet без открытого файла
+    (например, в отдельном процессе)"""
+    if encoding not in RASTER_ENCODINGS:
+        raise ValueError(f"Неизвестный способ сжатия: {encoding}")
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    width, height = img.size
+
+    kind, gray = _classify(img, lossy=encoding != ENCODING_FLATE)
+    if kind == SHEET_COLOR:
+        if encoding == ENCODING_FLATE:
+            return EncodedSheet(zlib.compress(img.tobytes("raw", "RGB"), 6), width, height,
+                                "DeviceRGB", 8, "FlateDecode", kind)
+        return EncodedSheet(_jpeg(img, jpeg_quality), width, height, "DeviceRGB", 8, "DCTDecode", kind)
+
+    if kind == SHEET_BILEVEL and encoding != ENCODING_JPEG:
+        # В PDF, как и в режиме "1" PIL, единичный бит - белый пиксель
+        bilevel = gray.point(_BILEVEL_TABLE, "1")
+        return EncodedSheet(zlib.compress(bilevel.tobytes(), 6), width, height,
+                            "DeviceGray", 1, "FlateDecode", kind)
+    if encoding == ENCODING_FLATE:
+        return EncodedSheet(zlib.compress(gray.tobytes(), 6), width, height,
+                            "DeviceGray", 8, "FlateDecode", kind)
+    return EncodedSheet(_jpeg(gray, jpeg_quality), width, height, "DeviceGray", 8, "DCTDecode", kind)
+
+
+def decode_sheet(sheet: EncodedSheet, draft_size: Optional[Tuple[int, int]] = None) -> Image.Image:
+    """Восстанавливает изображение закодированного листа (например, для превью).
+    С draft_size JPEG декодируется сразу в уменьшенном размере, не меньше draft_size."""
+    if sheet.filter == "DCTDecode":
+        img = Image.open(io.BytesIO(sheet.data))
+        if draft_size is not None:
+            img.draft(img.mode, draft_size)
+        return img
+    mode = "1" if sheet.bits_per_component == 1 else ("RGB" if sheet.color_space == "DeviceRGB" else "L")
+    return Image.frombytes(mode, (sheet.width, sheet.height), zlib.decompress(sheet.data))
+
+
+def read_sheet_data(pdf_path: str, sheet: EncodedSheet, data_span: Tuple[int, int]) -> EncodedSheet:
+    """Читает данные листа, записанного RasterPdfWriter, из готового файла.
+    sheet - параметры листа (данные в нем не нужны), data_span - из sheet_data_spans писателя."""
+    offset, length = data_span
+    with open(pdf_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    if len(data) != length:
+        raise ValueError(f"Лист не найден в файле {pdf_path}")
+    return sheet._replace(data=data)
+
+
+class RasterPdfWriter:
+    """Потоковая запись растровых листов в PDF.
+    Каждый лист кодируется и сразу записывается в файл, в памяти остаются
+    только смещения объектов для таблицы xref.
+    Серые листы хранятся в 8 битах, черно-белые в режимах auto и flate - в 1 бите."""
+
+    def __init__(self, output_path: str, resolution: float = 300.0, jpeg_quality: int = 75,
+                 encoding: str = ENCODING_JPEG):
+        if encoding not in RASTER_ENCODINGS:
+            raise ValueError(f"Неизвестный способ сжатия: {encoding}")
+        self.output_path = output_path
+        self.resolution = resolution
+        self.jpeg_quality = jpeg_quality
+        self.encoding = encoding
+        # Размер каждого записанного листа в байтах
+        self.sheet_sizes: List[int] = []
+        # Смещение и длина данных изображения каждого листа в файле (см. read_sheet_data)
+        self.sheet_data_spans: List[Tuple[int, int]] = []
+        self._file = open(output_path, "wb")
+        # Объекты 1 и 2 зарезервированы под каталог и дерево страниц
+        self._offsets: List[int] = [0, 0]
+        self._page_refs: List[int] = []
+        # Ключ листа -> номер объекта изображения: лист, добавленный повторно с тем же ключом,
+        # ссылается на уже записанное изображение. Сами данные листов не хранятся
+        self._image_refs: Dict[Hashable, Tuple[int, Tuple[int, int]]] = {}
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _begin_object(self) -> int:
+        self._offsets.append(self._file.tell())
+        return len(self._offsets)
+
+    def _write_object(self, obj_num: int, body: bytes) -> None:
+        self._file.write(f"{obj_num} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _write_stream(self, obj_num: int, header: str, data: bytes) -> int:
+        # Возвращает смещение данных потока в файле
+        self._file.write(f"{obj_num} 0 obj\n<< {header} /Length {len(data)} >>\nstream\n".encode())
+        data_offset = self._file.tell()
+        self._file.write(data)
+        self._file.write(b"\nendstream\nendobj\n")
+        return data_offset
+
+    def encode_sheet(self, img: Image.Image, encoding: Optional[str] = None,
+                     jpeg_quality: Optional[int] = None) -> EncodedSheet:
+        """Кодирует лист, не записывая его: результат можно переиспользовать в следующих заданиях.
+        encoding и jpeg_quality переопределяют настройки писателя для одного листа."""
+        return encode_sheet(img, encoding or self.encoding, jpeg_quality or self.jpeg_quality)
+
+    def add_encoded_sheet(self, sheet: EncodedSheet, key: Optional[Hashable] = None) -> int:
+        """Записывает закодированный лист в файл и возвращает количество записанных байт.
+        Изображение листа с уже встречавшимся ключом key не записывается еще раз:
+        новая страница ссылается на записанное ранее (без key повторы не ищутся)."""
+        start = self._file.tell()
+        width_pt = sheet.width * 72 / self.resolution
+        height_pt = sheet.height * 72 / self.resolution
+
+        if key is not None and key in self._image_refs:
+            image_num, data_span = self._image_refs[key]
+        else:
+            image_num = self._begin_object()
+            data_offset = self._write_stream(image_num, f"/Type /XObject /Subtype /Image /Width {sheet.width} "
+                                                        f"/Height {sheet.height} /ColorSpace /{sheet.color_space} "
+                                                        f"/BitsPerComponent {sheet.bits_per_component} "
+                                                        f"/Filter /{sheet.filter}",
+                                             sheet.data)
+            data_span = (data_offset, len(sheet.data))
+            if key is not None:
+                self._image_refs[key] = (image_num, data_span)
+        self.sheet_data_spans.append(data_span)
+
+        content = f"q {width_pt:.4f} 0 0 {height_pt:.4f} 0 0 cm /Im0 Do Q".encode()
+        content_num = self._begin_object()
+        self._write_stream(content_num, "", content)
+
+        page_num = self._begin_object()
+        self._write_object(page_num, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.4f} {height_pt:.4f}] "
+                                      f"/Resources << /XObject << /Im0 {image_num} 0 R >> >> "
+                                      f"/Contents {content_num} 0 R >>").encode())
+        self._page_refs.append(page_num)
+        self._file.flush()
+        written = self._file.tell() - start
+        self.sheet_sizes.append(written)
+        return written
+
+    def add_sheet(self, img: Image.Image, encoding: Optional[str] = None, jpeg_quality: Optional[int] = None) -> int:
+        """Кодирует и записывает лист в файл, возвращает количество записанных байт"""
+        return self.add_encoded_sheet(self.encode_sheet(img, encoding, jpeg_quality))
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        kids = " ".join(f"{num} 0 R" for num in self._page_refs)
+        self._offsets[1] = self._file.tell()
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_refs)} >>".encode())
+        self._offsets[0] = self._file.tell()
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self._file.tell()
+        self._file.write(f"xref\n0 {len(self._offsets) + 1}\n0000000000 65535 f \n".encode())
+        for offset in self._offsets:
+            self._file.write(f"{offset:010d} 00000 n \n".encode())
+        self._file.write(f"trailer\n<< /Size {len(self._offsets) + 1} /Root 1 0 R >>\n"
+                         f"startxref\n{xref_offset}\n%%EOF\n".encode())
+        self._file.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_refs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,341 @@
+# Режим "горячей папки": новые PDF во входных папках автоматически превращаются в буклеты.
+# Запуск из корня проекта: python -m web.scripts.watcher incoming --output-dir booklets --workers 2
+import argparse
+import collections
+import ctypes
+import ctypes.util
+import datetime
+import json
+import os
+import select
+import struct
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from web.scripts.PDFcreator import BACKEND_VECTOR, BACKEND_RASTER, BACKEND_STREAM
+from web.scripts.batch import OUTPUT_SUFFIX, is_source_pdf, output_path_for, process_document
+from web.scripts.log_app import LOG_DIR, log_server_action
+from web.scripts.page_cache import file_content_hash
+
+# Файл состояния: хэши уже обработанных документов переживают перезапуск
+WATCHER_STATE_FILE = os.path.join(LOG_DIR, "watcher_state.json")
+# Файл считается дописанным, если его размер и mtime не менялись столько секунд
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+# Период опроса папок, если inotify недоступен
+DEFAULT_POLL_INTERVAL = 1.0
+# Период записи статистики в лог (с)
+STATS_INTERVAL = 60.0
+# Сколько раз обрабатывается документ, который не удалось разложить (файл еще копируется,
+# заблокирован другой программой); после этого он пропускается до изменения содержимого
+MAX_ATTEMPTS = 3
+
+# Маски событий inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class _InotifySource:
+    """Источник изменений на inotify через libc, без сторонних зависимостей (только Linux)"""
+
+    def __init__(self, directories: List[str]):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc не найдена")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init"):
+            raise OSError("inotify не поддерживается")
+        self._fd = self._libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Не удалось инициализировать inotify")
+        self._directories: Dict[int, str] = {}
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), mask)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"Не удалось следить за папкой {directory}")
+            self._directories[wd] = directory
+
+    def poll(self, timeout: float) -> Optional[Set[str]]:
+        """Пути измененных файлов. None - очередь событий переполнена, нужно пересканировать папки"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        buffer = os.read(self._fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, name_len = _INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += _INOTIFY_EVENT.size
+            name = buffer[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if name and wd in self._directories:
+                changed.add(os.path.join(self._directories[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _PollingSource:
+    """Запасной источник изменений: периодическое сканирование папок"""
+
+    def __init__(self, directories: List[str]):
+        self._directories = directories
+        self._known: Dict[str, Tuple[int, int]] = {}
+
+    def poll(self, timeout: float) -> Optional[Set[str]]:
+        time.sleep(timeout)
+        current = {}
+        for directory in self._directories:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            current[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+        changed = {path for path, signature in current.items() if self._known.get(path) != signature}
+        self._known = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class HotFolderWatcher:
+    """Следит за входными папками и раскладывает новые PDF в буклеты.
+    Файл попадает в очередь после того, как его размер и mtime перестали меняться,
+    очередь обслуживает ограниченный пул процессов."""
+
+    def __init__(self, input_dirs: List[str], output_dir: str, flags: Optional[dict] = None,
+                 backend: str = BACKEND_VECTOR, workers: int = 2,
+                 debounce: float = DEFAULT_DEBOUNCE_SECONDS, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 state_path: str = WATCHER_STATE_FILE, use_inotify: bool = True):
+        self.input_dirs = [os.path.abspath(directory) for directory in input_dirs]
+        self.output_dir = os.path.abspath(output_dir)
+        self.flags = flags or {"rotate_all": False}
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.state_path = state_path
+        self.use_inotify = use_inotify
+
+        # Файлы, которые еще могут дописываться: путь -> (размер, mtime, время последнего изменения)
+        self._pending: Dict[str, Tuple[int, int, float]] = {}
+        # Дописанные файлы в ожидании свободного процесса: (путь, хэш содержимого)
+        self._ready: Deque[Tuple[str, str]] = collections.deque()
+        # Запущенные документы: future -> (путь, хэш содержимого)
+        self._in_flight: Dict[Future, Tuple[str, str]] = {}
+        self._queued_hashes: Set[str] = set()
+        self._processed: Dict[str, dict] = self._load_state()
+        self._stop_event = threading.Event()
+
+        self.documents_done = 0
+        self.documents_failed = 0
+        self.pages_done = 0
+        self._started = time.monotonic()
+
+    def _load_state(self) -> Dict[str, dict]:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f).get("processed", {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_state(self) -> None:
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"processed": self._processed}, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def _create_source(self):
+        if self.use_inotify:
+            try:
+                return _InotifySource(self.input_dirs)
+            except (OSError, AttributeError) as e:
+                log_server_action("inotify недоступен, используется опрос папок", "warning", {"error": str(e)})
+        return _PollingSource(self.input_dirs)
+
+    def _scan_all(self) -> Set[str]:
+        paths = set()
+        for directory in self.input_dirs:
+            with os.scandir(directory) as it:
+                paths.update(entry.path for entry in it if entry.is_file())
+        return paths
+
+    def _track(self, paths: Set[str]) -> None:
+        now = time.monotonic()
+        for path in paths:
+            if is_source_pdf(path) and path not in self._pending:
+                self._pending[path] = (-1, -1, now)
+
+    def _check_pending(self) -> None:
+        """Переносит в очередь файлы, которые не менялись дольше debounce"""
+        now = time.monotonic()
+        for path, (size, mtime, changed_at) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Файл удалили или переместили до обработки
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - changed_at >= self.debounce and stat.st_size > 0:
+                del self._pending[path]
+                self._enqueue(path)
+
+    def _should_process(self, content_hash: str) -> bool:
+        # Готовые буклеты не пересоздаются, неудачные попытки повторяются до MAX_ATTEMPTS раз
+        entry = self._processed.get(content_hash)
+        if entry is None:
+            return True
+        return entry["status"] != "done" and entry.get("attempts", 1) < MAX_ATTEMPTS
+
+    def _enqueue(self, path: str) -> None:
+        try:
+            content_hash = file_content_hash(path)
+        except OSError:
+            return
+        if content_hash in self._queued_hashes or not self._should_process(content_hash):
+            return
+        self._queued_hashes.add(content_hash)
+        self._ready.append((path, content_hash))
+
+    def _dispatch(self, executor: ProcessPoolExecutor) -> None:
+        while self._ready and len(self._in_flight) < self.workers:
+            path, content_hash = self._ready.popleft()
+            output_path = output_path_for(path, self.output_dir, OUTPUT_SUFFIX)
+            future = executor.submit(process_document, path, output_path, self.flags, self.backend)
+            self._in_flight[future] = (path, content_hash)
+
+    def _collect(self) -> None:
+        finished = [future for future in self._in_flight if future.done()]
+        for future in finished:
+            path, content_hash = self._in_flight.pop(future)
+            self._queued_hashes.discard(content_hash)
+            try:
+                entry = future.result()
+            except Exception as e:
+                entry = {"status": "error", "error": str(e)}
+            entry["finished_at"] = datetime.datetime.now().isoformat()
+            previous = self._processed.get(content_hash)
+            entry["attempts"] = (previous.get("attempts", 1) + 1) if previous is not None else 1
+            self._processed[content_hash] = entry
+
+            if entry["status"] == "done":
+                self.documents_done += 1
+                self.pages_done += entry.get("source_pages", 0)
+                log_server_action("Буклет создан из горячей папки", "info", entry)
+            else:
+                self.documents_failed += 1
+                log_server_action("Ошибка обработки файла из горячей папки", "error", entry)
+                if entry["attempts"] < MAX_ATTEMPTS:
+                    # Повторная попытка: файл снова ждет debounce и заново хэшируется
+                    self._track({path})
+        if finished:
+            self._save_state()
+
+    def queue_depth(self) -> int:
+        return len(self._pending) + len(self._ready)
+
+    def _log_stats(self) -> None:
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        log_server_action("Статистика горячей папки", "info", {
+            "queue_depth": self.queue_depth(),
+            "in_flight": len(self._in_flight),
+            "documents_done": self.documents_done,
+            "documents_failed": self.documents_failed,
+            "documents_per_minute": round(self.documents_done * 60 / elapsed, 2),
+            "pages_per_second": round(self.pages_done / elapsed, 2)
+        })
+
+    def run(self) -> None:
+        """Основной цикл; завершается после stop() или Ctrl+C"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        source = self._create_source()
+        log_server_action("Запущено наблюдение за горячими папками", "info", {
+            "input_dirs": self.input_dirs,
+            "output_dir": self.output_dir,
+            "workers": self.workers,
+            "source": type(source).__name__,
+            "processed_known": len(self._processed)
+        })
+        # Файлы, появившиеся пока наблюдатель был остановлен
+        self._track(self._scan_all())
+        last_stats = time.monotonic()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                while not self._stop_event.is_set():
+                    changed = source.poll(self.poll_interval)
+                    self._track(self._scan_all() if changed is None else changed)
+                    self._check_pending()
+                    self._collect()
+                    self._dispatch(executor)
+                    if time.monotonic() - last_stats >= STATS_INTERVAL:
+                        self._log_stats()
+                        last_stats = time.monotonic()
+                # Дожидаемся уже запущенных документов, очередь сохранится в следующем запуске
+                for future in list(self._in_flight):
+                    future.result()
+                self._collect()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            source.close()
+            self._log_stats()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Автоматическое создание буклетов из PDF в горячих папках")
+    parser.add_argument("input_dirs", nargs="+", help="Папки, за которыми нужно следить")
+    parser.add_argument("-o", "--output-dir", required=True, help="Папка для готовых буклетов")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="Количество параллельных процессов")
+    parser.add_argument("--backend", choices=[BACKEND_VECTOR, BACKEND_RASTER, BACKEND_STREAM],
+                        default=BACKEND_VECTOR, help="Режим раскладки")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE_SECONDS,
+                        help="Сколько секунд файл должен не меняться перед обработкой")
+    parser.add_argument("--poll", action="store_true", help="Не использовать inotify, только опрос папок")
+    parser.add_argument("--state", default=WATCHER_STATE_FILE, help="Файл состояния с хэшами обработанных PDF")
+    parser.add_argument("--rotate-all", action="store_true", help="Поворот всего документа")
+    parser.add_argument("--rotate", action="store_true", help="Поворот половины документа")
+    parser.add_argument("--flip-horizontal", action="store_true", help="Отражение по горизонтали")
+    parser.add_argument("--flip-vertical", action="store_true", help="Отражение по вертикали")
+    args = parser.parse_args(argv)
+
+    for directory in args.input_dirs:
+        if not os.path.isdir(directory):
+            print(f"Папка не найдена: {directory}")
+            return 1
+
+    flags = {
+        "rotate_all": args.rotate_all,
+        "rotate": args.rotate,
+        "flip_horizontal": args.flip_horizontal,
+        "flip_vertical": args.flip_vertical
+    }
+    watcher = HotFolderWatcher(args.input_dirs, args.output_dir, flags, args.backend, args.workers,
+                               debounce=args.debounce, state_path=args.state, use_inotify=not args.poll)
+    watcher.run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())